@@ -0,0 +1,415 @@
+"""Benchmarks for Navi's hot paths, run headless (QT_QPA_PLATFORM=offscreen) against a local HTTP stand-in server.
+
+Usage: python bench.py [--json FILE] [--baseline FILE] [--tolerance 0.25] [--repeat 3] [name ...]   (no names runs everything)
+
+Every benchmark returns flat {metric: value} results where lower is better; each runs --repeat times and the median
+of every metric is kept. --json writes them (plus run info) to FILE; --baseline compares against such a file and exits
+with status 1 if any metric got more than --tolerance worse (and worse by more than its unit's noise floor), so a
+regression fails the run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PyQt6.QtCore import QTimer, QUrl, PYQT_VERSION_STR
+from simple_browser import NaviStore, Omnibox, FilterIndex, SiteBundles, PAINT_JS, KV_KEYS, TOP_SITES, frecency, register_schemes, rss_mb
+
+_app = None
+def qt_app():
+    """Offscreen QApplication (created once per run)."""
+    global _app
+    if _app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication
+        register_schemes()
+        _app = QApplication(sys.argv)
+    return _app
+
+def browser(pool=0):
+    """A shown NaviBrowser on a fresh profile directory; the tab pool is off unless asked for."""
+    from simple_browser import NaviBrowser
+    app = qt_app()
+    os.chdir(tempfile.mkdtemp(prefix="navi-bench-"))
+    w = NaviBrowser(); w.data['settings']['tab_pool'] = pool; w.show()
+    spin(app, lambda: False, 0.1) # let deferred_init run
+    return app, w
+
+def spin(app, cond, timeout=30):
+    end = time.perf_counter() + timeout
+    while not cond() and time.perf_counter() < end: app.processEvents(); time.sleep(0.001)
+
+def mid(xs): return sorted(xs)[len(xs) // 2]
+
+# --- Stand-in web server ---
+class PageHandler(BaseHTTPRequestHandler):
+    # A plain article page of ~40 KB, roughly what a text-heavy site sends
+    BODY = "".join(f"<h2>Section {i}</h2><p>{'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 12}</p>" for i in range(50))
+
+    ASSET = ("/* " + "x" * 64 * 1024 + " */").encode() # 64 KB script, cacheable for a day
+
+    def do_GET(self):
+        if self.path.startswith("/asset/"):
+            return self.reply(self.ASSET, "application/javascript", "max-age=86400")
+        # /cache/... pages pull in 10 cacheable scripts, like a typical site's bundles
+        assets = "".join(f"<script src='/asset/{i}.js'></script>" for i in range(10)) if self.path.startswith("/cache/") else ""
+        self.reply(f"<!DOCTYPE html><html><head><title>Bench {self.path}</title>{assets}</head><body>{self.BODY}</body></html>".encode(), "text/html; charset=utf-8")
+
+    def reply(self, data, mime, cache="no-store"):
+        self.send_response(200); self.send_header("Content-Type", mime); self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", cache); self.end_headers(); self.wfile.write(data)
+
+    def log_message(self, *a): pass
+
+_server = None
+def server():
+    """Base url of the stand-in server (started once per run)."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{_server.server_address[1]}"
+
+def time_to_paint(app, w, u=None):
+    t0 = time.perf_counter()
+    b = w.add_tab(u)
+    spin(app, lambda: b.is_loaded)
+    b.page().runJavaScript(PAINT_JS)
+    painted = []
+    def poll(): b.page().runJavaScript("window.__painted", lambda v: painted.append(1) if v else QTimer.singleShot(1, poll))
+    poll(); spin(app, lambda: painted)
+    return (time.perf_counter() - t0) * 1e3
+
+def fill_history(st, size, start=0):
+    with st.db:
+        st.db.executemany(st.VISIT, [(f"https://example.com/{i}", f"Page {i} about topic{i % 97}", 1e9 + i) for i in range(start, size)])
+
+# --- Benchmarks ---
+def bench_store(sizes=(0, 10000, 50000, 100000), n=500):
+    """Per-navigation history write cost (GUI-thread enqueue + batched commit) as history grows."""
+    res = {}
+    with tempfile.TemporaryDirectory() as d:
+        st = NaviStore(os.path.join(d, "bench.db"), delay=0)
+        have = 0
+        for size in sizes:
+            fill_history(st, size, have); have = max(have, size)
+            t0 = time.perf_counter()
+            for i in range(n): st.add_hist({'url': f"https://bench.test/{size}/{i}", 'title': "Bench", 'time': time.time()})
+            t1 = time.perf_counter(); st.flush(); t2 = time.perf_counter()
+            res[f"enqueue_us@{size}"] = (t1 - t0) / n * 1e6; res[f"total_us@{size}"] = (t2 - t0) / n * 1e6
+        st.close()
+    return res
+
+def bench_history(size=100000, n=50):
+    """navi://history query cost (first page, deep page, full-text search) at a large history."""
+    res = {}
+    with tempfile.TemporaryDirectory() as d:
+        st = NaviStore(os.path.join(d, "bench.db"), delay=0)
+        fill_history(st, size)
+        for name, q, before in [("first_page", "", None), ("deep_page", "", (1e9 + size // 10, size // 10)), ("search", "topic42", None)]:
+            t0 = time.perf_counter()
+            for _ in range(n): st.query_hist(q, before)
+            res[f"{name}_ms"] = (time.perf_counter() - t0) / n * 1e3
+        st.close()
+    return res
+
+def bench_load(n=20):
+    """add_tab to loadFinished for a page from the stand-in server."""
+    app, w = browser()
+    times = []
+    for i in range(n):
+        t0 = time.perf_counter(); b = w.add_tab(QUrl(f"{server()}/load/{i}"))
+        spin(app, lambda: b.is_loaded); times.append((time.perf_counter() - t0) * 1e3)
+    w.close()
+    return {"p50_ms": mid(times), "max_ms": max(times)}
+
+def bench_cache(n=6):
+    """First vs repeat load of a page with cacheable scripts, in fresh tabs of the same profile: load time and KB that
+    still came over the network (repeat loads should come from the disk cache)."""
+    from simple_browser import PERF
+    app, w = browser()
+    times, kb = [], []
+    for i in range(n):
+        t0 = time.perf_counter(); b = w.add_tab(QUrl(f"{server()}/cache/page"))
+        spin(app, lambda: b.is_loaded); times.append((time.perf_counter() - t0) * 1e3)
+        spin(app, lambda: 'bytes' in PERF.loads[-1], 5); kb.append(PERF.loads[-1].get('bytes', 0) / 1024)
+    w.close()
+    return {"cold_ms": times[0], "repeat_ms": mid(times[1:]), "cold_kb": kb[0], "repeat_kb": mid(kb[1:])}
+
+def bench_newtab(n=10, pools=(0, 1)):
+    """Time from add_tab to the new tab page being painted, without and with the pre-warmed tab pool."""
+    from simple_browser import POOL_REFILL_MS
+    app, w = browser()
+    res = {}
+    for size in pools:
+        w.data['settings']['tab_pool'] = size; w.pool.schedule()
+        times = []
+        for _ in range(n):
+            spin(app, lambda: len(w.pool.tabs) >= size and all(t.is_loaded for t in w.pool.tabs), timeout=POOL_REFILL_MS / 1000 * 3 + 10)
+            times.append(time_to_paint(app, w))
+        res[f"pool{size}_p50_ms"] = mid(times); res[f"pool{size}_max_ms"] = max(times)
+    w.close()
+    return res
+
+def profile_data(w, sites=200, downloads=500, exts=10):
+    """Realistic profile contents: sites (their metadata; files live in bundles), top sites, saved pages, extensions."""
+    w.data['sites'] = {f"site{i}.pw-navi": {'domain': f"site{i}.pw-navi", 'title': f"Site {i}"} for i in range(sites)}
+    w.data['top_sites'] = [[f"https://site{i}.com/", f"Site {i}"] for i in range(TOP_SITES)]
+    w.data['extensions'] = {f"ext{i}": {'code': "console.log(1);", 'active': True, 'match': "", 'run_at': "idle", 'isolated': False} for i in range(exts)}
+    for i in range(downloads): w.save_dl(f"Saved page {i}", b"<p>saved</p>" * 100, f"https://example.com/{i}")
+
+def bench_pages(sizes=(10000, 100000), n=20):
+    """Render time of every internal page handle_cmd shows, uncached, with 500 saved pages, 200 sites and 10k/100k history."""
+    app, w = browser()
+    profile_data(w)
+    res, have = {}, 0
+    def render(u):
+        t0 = time.perf_counter()
+        for _ in range(n): w.router.touch(*KV_KEYS, 'downloads', 'assets'); w.router.route(QUrl(u))
+        return (time.perf_counter() - t0) / n * 1e3
+    for size in sizes:
+        fill_history(w.store, size, have); have = size
+        res[f"history_ms@{size}"] = render("navi://history")
+        res[f"history_search_ms@{size}"] = render("navi://history?q=topic42")
+    for name in ("home", "settings", "store", "pw", "cws", "dlw", "tabs"): res[f"{name}_ms"] = render(f"navi://{name}")
+    w.close()
+    return res
+
+def bench_profile(sizes=(0, 200, 2000)):
+    """save_data (all keys, enqueue + commit) and load_data cost as the profile grows (sites and saved pages)."""
+    app, w = browser()
+    res = {}
+    for size in sizes:
+        profile_data(w, sites=size, downloads=size - len(w.data['downloads']), exts=0); w.store.flush()
+        t0 = time.perf_counter(); w.save_data(); t1 = time.perf_counter(); w.store.flush(); t2 = time.perf_counter()
+        w.load_data(); t3 = time.perf_counter()
+        res[f"save_enqueue_ms@{size}"] = (t1 - t0) * 1e3; res[f"save_ms@{size}"] = (t2 - t0) * 1e3; res[f"load_ms@{size}"] = (t3 - t2) * 1e3
+    w.close()
+    return res
+
+def bench_inject(n=10, counts=(0, 10)):
+    """Extension overhead: page load time and the extra wait in BrowserTab.loaded for the injected-extensions report."""
+    app, w = browser()
+    res = {}
+    for k in counts:
+        for name in list(w.data['extensions']): w.ext.uninstall(name)
+        w.data['extensions'] = {}
+        for i in range(k):
+            e = w.data['extensions'][f"ext{i}"] = {'code': f"window.__x{i} = document.title.length;", 'active': True, 'match': "", 'run_at': "idle", 'isolated': False}
+            w.ext.install(f"ext{i}", e)
+        loads, reports = [], []
+        for i in range(n):
+            t0 = time.perf_counter(); b = w.add_tab(QUrl(f"{server()}/inject/{k}/{i}"))
+            spin(app, lambda: b.is_loaded); t1 = time.perf_counter()
+            spin(app, lambda: len(b.injected) >= k, 5); t2 = time.perf_counter()
+            loads.append((t1 - t0) * 1e3); reports.append((t2 - t1) * 1e3)
+        res[f"load_ms@{k}"] = mid(loads); res[f"report_ms@{k}"] = mid(reports)
+    w.close()
+    return res
+
+def bench_memory(n=10):
+    """Memory per open tab: renderer RSS and growth of the browser process itself (MB)."""
+    app, w = browser()
+    base = rss_mb(os.getpid())
+    bs = [w.add_tab(QUrl(f"{server()}/mem/{i}")) for i in range(n)]
+    spin(app, lambda: all(b.is_loaded for b in bs))
+    spin(app, lambda: False, 1) # let renderers settle
+    res = {"renderer_mb_per_tab": w.tm.rss() / (n + 1), "browser_mb_per_tab": (rss_mb(os.getpid()) - base) / n}
+    w.close()
+    return res
+
+def bench_omnibox(size=100000, n=300):
+    """Omnibox cost at a large history: bulk index build, per-keystroke lookup and incremental visit."""
+    rnd, now = random.Random(1), time.time()
+    words = ["news", "python", "docs", "weather", "music", "video", "recipe", "search", "maps", "mail", "shop", "forum", "wiki", "game", "code"]
+    hosts = [f"{rnd.choice(words)}{i}.{rnd.choice(['com', 'org', 'net', 'io'])}" for i in range(size // 20)]
+    rows = [(f"https://{rnd.choice(['www.', ''])}{rnd.choice(hosts)}/{rnd.choice(words)}/{i}", f"{rnd.choice(words).title()} {rnd.choice(words)} page {i}",
+             "history", frecency(rnd.randint(1, 50), now - rnd.random() * 90 * 86400)) for i in range(size)]
+    om = Omnibox()
+    t0 = time.perf_counter(); om.idx, om.meta = om.load(rows); build = time.perf_counter() - t0
+    typed = [u.split("://")[1][:12] for u, *_ in rnd.sample(rows, n)] + [t[:10] for _, t, *_ in rnd.sample(rows, n)] + ["python do", "z", "news1 py"]
+    times = []
+    for text in typed:
+        for j in range(1, len(text) + 1):
+            t0 = time.perf_counter(); om.suggest(text[:j]); times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    t0 = time.perf_counter()
+    for u, t, *_ in rnd.sample(rows, n): om.visit(u, t)
+    for i in range(n): om.visit(f"https://new.test/{i}", f"New page {i}")
+    visit = (time.perf_counter() - t0) / (2 * n) * 1e6
+    return {"build_ms": build * 1e3, "keystroke_p50_us": times[len(times) // 2], "keystroke_p99_us": times[int(len(times) * .99)],
+            "keystroke_max_us": times[-1], "visit_us": visit}
+
+def bench_theme(tabs=20, n=10):
+    """Theme switch latency with `tabs` tabs open (half internal pages, half web pages): time spent in
+    apply_theme, time until every internal page shows the new colours, and how many tabs reloaded."""
+    from simple_browser import InternalPages
+    app, w = browser()
+    bs = [w.add_tab(QUrl("navi://settings" if i % 2 else f"{server()}/theme/{i}")) for i in range(tabs - 1)]
+    spin(app, lambda: all(b.is_loaded for b in bs))
+    internal = [b for b in bs if b.url().scheme() == "navi"]
+    reloads = []
+    for i in range(w.tabs.count()): w.tabs.widget(i).loadStarted.connect(lambda: reloads.append(1))
+    applied, shown = [], []
+    for i in range(n):
+        st = w.data['settings']; st['theme'] = "light" if st['theme'] != "light" else "dark"
+        want = InternalPages.theme_vars(st['theme'], st['mode']).split("--bg: ")[1].split(";")[0]
+        t0 = time.perf_counter(); w.apply_theme(); t1 = time.perf_counter()
+        done = set()
+        def poll():
+            for b in internal:
+                b.page().runJavaScript("getComputedStyle(document.body).getPropertyValue('--bg').trim()", lambda v, b=b: done.add(b) if v == want else None)
+        while len(done) < len(internal) and time.perf_counter() - t1 < 10: poll(); spin(app, lambda: False, 0.002)
+        applied.append((t1 - t0) * 1e3); shown.append((time.perf_counter() - t0) * 1e3)
+    w.close()
+    return {"apply_ms": mid(applied), "pages_ms": mid(shown), "reloads": len(reloads)}
+
+def filter_list(n, rnd):
+    """Synthetic EasyList-shaped rules: mostly ||host^, then host+path, path fragments, options and exceptions."""
+    words = ["ad", "ads", "track", "pixel", "banner", "stats", "beacon", "promo", "sponsor", "metrics", "tag", "analytics"]
+    out = []
+    for i in range(n):
+        k, h = rnd.random(), f"{rnd.choice(words)}{i}.{rnd.choice(['com', 'net', 'io'])}"
+        if k < .55: out.append(f"||{h}^")
+        elif k < .65: out.append(f"||{h}^$third-party")
+        elif k < .75: out.append(f"||{h}/{rnd.choice(words)}/*$script,image")
+        elif k < .88: out.append(f"/{rnd.choice(words)}{i}/{rnd.choice(words)}_")
+        elif k < .94: out.append(f"-{rnd.choice(words)}-{i}-")
+        elif k < .98: out.append(f"||{h}^$domain=site{i % 50}.com|~m.site{i % 50}.com")
+        else: out.append(f"@@||{h}/ok/")
+    return out, words
+
+def request_log(n, rnd, words, rules):
+    """Synthetic page-load traffic: (type, first-party host, url), about one in five requests aimed at a listed host."""
+    types = ["script", "image", "image", "stylesheet", "xmlhttprequest", "font", "subdocument"]
+    cdns = [f"cdn{i}.static.net" for i in range(200)] + [f"img{i}.site{i % 50}.com" for i in range(200)]
+    out = []
+    for _ in range(n):
+        host = rnd.choice(rules)[2:].split("^")[0].split("/")[0] if rnd.random() < .2 else rnd.choice(cdns)
+        path = "/".join(f"{rnd.choice(words)}{rnd.randint(0, 60000)}" for _ in range(rnd.randint(1, 4)))
+        out.append((rnd.choice(types), f"site{rnd.randint(0, 60)}.com", f"https://{host}/{path}.{rnd.choice(['js', 'png', 'css', 'json'])}?v={rnd.randint(0, 999)}"))
+    return out
+
+def bench_blocker(rules=50000, n=20000):
+    """Content blocker: compile, cached-index load and regex warm-up times for a 50k-rule list, and per-request match cost over a
+    request log. NAVI_BENCH_FILTERS (a filter list) and NAVI_BENCH_REQUESTS (lines of "type first-party-url url")
+    replay real data instead of the synthetic list and traffic."""
+    from urllib.parse import urlsplit
+    rnd = random.Random(1)
+    lines, words = filter_list(rules, rnd)
+    if os.environ.get("NAVI_BENCH_FILTERS"):
+        with open(os.environ["NAVI_BENCH_FILTERS"], encoding="utf-8", errors="replace") as f: lines = f.read().splitlines()
+    log = request_log(n, rnd, words, [l for l in lines if l.startswith("||")] or ["||example.com^"])
+    if os.environ.get("NAVI_BENCH_REQUESTS"):
+        with open(os.environ["NAVI_BENCH_REQUESTS"]) as f: log = [(t, urlsplit(o).hostname or "", u) for t, o, u in (l.split() for l in f if l.strip())]
+    t0 = time.perf_counter(); idx = FilterIndex.compile(lines); t1 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as d:
+        p = os.path.join(d, "index.pkl"); idx.save(p, "bench")
+        t2 = time.perf_counter(); idx = FilterIndex.load(p, "bench"); t3 = time.perf_counter()
+    t4 = time.perf_counter(); idx.block.warm(); idx.allow.warm(); t5 = time.perf_counter()
+    reqs = [(u, urlsplit(u).hostname or "", o, t) for t, o, u in log]
+    times, blocked = [], 0
+    for r in reqs:
+        t = time.perf_counter(); blocked += idx.match(*r); times.append((time.perf_counter() - t) * 1e6)
+    print(f"{idx.rules} rules, {len(reqs)} requests, {blocked / len(reqs) * 100:.1f}% blocked")
+    return {"compile_ms": (t1 - t0) * 1e3, "load_ms": (t3 - t2) * 1e3, "warm_ms": (t5 - t4) * 1e3, "match_p50_us": mid(times),
+            "match_p99_us": sorted(times)[int(len(times) * .99)], "match_mean_us": sum(times) / len(times)}
+
+def bench_sites(files=200, n=20):
+    """Local site bundles: per-request serve cost for a site of small html/css/js files plus a few images, on a cold cache
+    (disk read) and a hot one (LRU hit after a stat), and for a file too big to be cached."""
+    rnd = random.Random(1)
+    with tempfile.TemporaryDirectory() as d:
+        sb = SiteBundles(d)
+        sb.save_index("bench.pw-navi", "<link rel=stylesheet href=css/0.css>" + "<p>hello</p>" * 500)
+        names = [f"{k}/{i}.{k}" for i in range(files) for k in ("css", "js")] + [f"img/{i}.png" for i in range(10)]
+        for name in names:
+            p = sb.path("bench.pw-navi", name); os.makedirs(os.path.dirname(p), exist_ok=True)
+            with open(p, 'wb') as f: f.write(rnd.randbytes(200000 if name.startswith("img") else 5000))
+        with open(sb.path("bench.pw-navi", "big.mp4"), 'wb') as f: f.write(rnd.randbytes(SiteBundles.MAX_FILE + 1))
+        names.append("")
+        def serve(ns):
+            times = []
+            for name in ns:
+                t = time.perf_counter(); sb.serve("bench.pw-navi", name); times.append((time.perf_counter() - t) * 1e6)
+            return times
+        cold = serve(names); hot = serve(names * n); big = serve(["big.mp4"] * n)
+        print(f"{len(names)} files, {sb.size / 1048576:.1f} MB cached")
+    return {"cold_p50_us": mid(cold), "hot_p50_us": mid(hot), "hot_p99_us": sorted(hot)[int(len(hot) * .99)], "big_ms": mid(big) / 1e3}
+
+def bench_session(tabs=50, n=3):
+    """Startup with a saved session of 1 and of `tabs` tabs: NaviBrowser() to the active tab's loadFinished. Only the
+    active tab is loaded on restore, so both should take about the same time."""
+    from simple_browser import NaviBrowser, BrowserTab
+    res = {}
+    for size in (1, tabs):
+        app, w = browser()
+        for i in range(size - 1): w.add_tab(QUrl(f"{server()}/session/{i}"))
+        spin(app, lambda: all(w.tabs.widget(i).is_loaded for i in range(w.tabs.count())), 60)
+        w.close() # saves the session
+        times = []
+        for _ in range(n):
+            t0 = time.perf_counter(); w = NaviBrowser(); w.show(); b = w.tabs.currentWidget()
+            spin(app, lambda: b.is_loaded); times.append((time.perf_counter() - t0) * 1e3)
+            views = sum(isinstance(w.tabs.widget(i), BrowserTab) for i in range(w.tabs.count())); w.close()
+        print(f"{size} tabs restored, {views} loaded")
+        res[f"restore_ms@{size}"] = mid(times)
+    return res
+
+BENCHES = {"store": bench_store, "history": bench_history, "load": bench_load, "cache": bench_cache, "newtab": bench_newtab, "pages": bench_pages,
+           "profile": bench_profile, "inject": bench_inject, "memory": bench_memory, "omnibox": bench_omnibox, "theme": bench_theme,
+           "blocker": bench_blocker, "sites": bench_sites, "session": bench_session}
+
+# --- Runner ---
+# Differences below these (by the metric's unit suffix) are timer and scheduler noise, whatever the percentage
+FLOORS = {"us": 25, "ms": 2, "kb": 16, "mb": 5}
+TAILS = ("max", "p99") # single worst samples: twice the tolerance
+
+def unit(m): return m.split("@")[0].rsplit("_", 1)[-1]
+
+def compare(results, baseline, tolerance):
+    """Metrics more than `tolerance` (a fraction) and more than their noise floor worse than the baseline, as printable lines."""
+    bad = []
+    for name, metrics in baseline.items():
+        for m, old in metrics.items():
+            new = results.get(name, {}).get(m)
+            tol = tolerance * (2 if any(t in m for t in TAILS) else 1)
+            if new is not None and new > old * (1 + tol) and new - old > FLOORS.get(unit(m), 0):
+                bad.append(f"{name}.{m}: {old:.2f} -> {new:.2f}" + (f" (+{(new / old - 1) * 100:.0f}%)" if old else ""))
+    return bad
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Navi benchmarks")
+    ap.add_argument("names", nargs="*", help=f"benchmarks to run ({', '.join(BENCHES)}); default all")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="compare against results written earlier with --json")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline (default 0.25 = 25%%)")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the median of each metric is kept (default 3)")
+    a = ap.parse_args(argv)
+    for name in a.names:
+        if name not in BENCHES: ap.error(f"unknown benchmark {name}")
+    cwd, results = os.getcwd(), {}
+    for name in a.names or BENCHES:
+        print(f"== {name}"); runs = [BENCHES[name]() for _ in range(max(1, a.repeat))]
+        results[name] = {m: mid([r[m] for r in runs]) for m in runs[0]}
+        for m, v in results[name].items(): print(f"{m:>24} {v:>12.2f}")
+    os.chdir(cwd)
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump({'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': platform.python_version(), 'pyqt': PYQT_VERSION_STR,
+                       'platform': platform.platform(), 'results': results}, f, indent=2)
+    if a.baseline:
+        with open(a.baseline) as f: bad = compare(results, json.load(f)['results'], a.tolerance)
+        print(f"== vs {a.baseline}: " + (f"{len(bad)} regression(s)" if bad else "no regressions"))
+        for line in bad: print("  " + line)
+        return 1 if bad else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,22 +1,183 @@
 import sys
 import json
 import os
+import re
 import time
+import zlib
+import queue
+import hashlib
+import html
+import functools
+import heapq
+import itertools
+import math
+import mimetypes
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PyQt6.QtCore import QUrl, Qt, QSize, QTimer
+T_START = time.perf_counter() # before the Qt imports, so --profile-startup can time them
+from PyQt6 import sip
+from PyQt6.QtCore import QUrl, QUrlQuery, Qt, QSize, QTimer, QBuffer, QIODevice, QByteArray, QDataStream, QObject, pyqtSignal
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+# --- Single Instance ---
+# One browser per data directory (everything lives in the cwd), so the socket name comes from the cwd
+INSTANCE_NAME = "navi-" + hashlib.sha1(os.path.abspath(".").encode()).hexdigest()[:12]
+INSTANCE_TIMEOUT = 250 # ms a launch waits on the running browser before starting a window of its own
+
+# Qt's own command line options that take the next argument as their value (QGuiApplication/QApplication docs)
+QT_VALUE_OPTS = {"platform", "platformpluginpath", "platformtheme", "plugin", "qmljsdebugger", "style", "stylesheet", "session", "display",
+                 "geometry", "title", "name", "qwindowgeometry", "qwindowicon", "qwindowtitle"}
+
+def launch_urls(args):
+    """Command line urls, skipping options and the values of Qt's. Existing paths become absolute file:// urls, as the
+    running browser may have another cwd. Runs before QApplication has taken its options out of sys.argv."""
+    urls, skip = [], False
+    for a in args:
+        if skip: skip = False
+        elif a.startswith("-"): skip = "=" not in a and a.lstrip("-") in QT_VALUE_OPTS
+        else: urls.append(QUrl.fromLocalFile(os.path.abspath(a)).toString() if os.path.exists(a) else a)
+    return urls
+
+def forward_launch(urls):
+    """Hand urls to the browser already running on this data directory. False if there is none."""
+    s = QLocalSocket(); s.connectToServer(INSTANCE_NAME)
+    if not s.waitForConnected(INSTANCE_TIMEOUT): return False
+    s.write(json.dumps(urls).encode() + b"\n"); s.waitForBytesWritten(INSTANCE_TIMEOUT); s.disconnectFromServer()
+    return True
+
+# A second launch is done here, before the QtWidgets/QtWebEngine imports that make up most of startup (--new-instance opts out)
+if __name__ == '__main__' and "--new-instance" not in sys.argv and forward_launch(launch_urls(sys.argv[1:])): sys.exit(0)
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QLineEdit,
     QWidget, QVBoxLayout, QLabel, QPushButton, QTextEdit,
     QMessageBox, QTabWidget, QMenu, QDialog, QPlainTextEdit,
-    QInputDialog
+    QInputDialog, QComboBox, QCheckBox, QCompleter
 )
-from PyQt6.QtGui import QAction, QIcon
+from PyQt6.QtGui import QAction, QIcon, QImage, QStandardItemModel, QStandardItem, QDesktopServices, QPalette, QColor
 from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+from PyQt6.QtWebEngineCore import (
+    QWebEnginePage, QWebEngineProfile, QWebEngineSettings, QWebEngineDownloadRequest, QWebEngineScript,
+    QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob, QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+)
 
 # --- Constants ---
 DATA_FILE = "navi_data.json"
+DB_FILE = "navi_data.db"
+ARCHIVE_DIR = "navi_archive"
+ASSET_DIR = "navi_assets"
+SITE_DIR = "navi_sites" # one directory per local site: index.html plus its css, js and images
+PROFILE_DIR = "navi_profiles" # per-profile cookies, storage and HTTP cache (unless moved in settings)
+FILTER_DIR = "navi_filters" # filter lists (*.txt, EasyList syntax) and their compiled index
+FILTER_MAX_AGE = 4 * 86400 # re-download the default lists after this many seconds
+ASSET_BUDGET = 64 * 1048576 # bytes of cached background images kept on disk
+SITE_CACHE = 32 * 1048576 # bytes of local site files kept in memory
+THUMB_BUDGET = 16 * 1048576 # bytes of top-site thumbnails kept on disk
+THUMB_MAX_AGE = 3 * 86400 # a thumbnail older than this is recaptured on the next visit
+THUMB_DELAY_MS = 2000 # wait after loadFinished before capturing, so the page has settled and the load isn't slowed
+TOP_SITES = 8 # tiles in the new tab page's most visited grid
+SESSION_SAVE_MS = 30000 # how often the open tabs are saved (they are also saved on exit)
+SAVE_START_MS = 10000 # stop waiting for a page save's download request after this long
 TWO_WEEKS_SECONDS = 1209600
+FLUSH_DELAY = 0.5 # seconds the writer waits to batch up more writes
+HIST_PAGE = 50 # rows per navi://history page
+HIST_EXPIRE_MS = 3600000 # how often history older than the retention setting is dropped while running
+TAB_SWEEP_MS = 15000 # how often background tabs are checked for freezing/discarding
+POOL_REFILL_MS = 1000 # delay before warming another new tab, so refilling stays out of the way of the tab just opened
+FRECENCY_HALF_LIFE = 14 * 86400 # seconds for a visit's weight in omnibox ranking to halve
+OMNI_SHOWN = 8 # suggestions shown under the url bar
+# Internal pages (scheme -> hosts) that may trigger NAVI_ACTIONS; saved pages and local sites carry web content and may not
+TRUSTED_HOSTS = {"navi": ("home", "newtab", "settings", "store", "pw", "cws", "dlw", "history", "tabs", "perf", "cache"), "local": ("navi",)}
+# Saved pages are third-party HTML: served on their own host with scripts and plugins off
+ARCHIVE_CSP = b"<meta http-equiv='Content-Security-Policy' content=\"script-src 'none'; object-src 'none'\">"
+# navi:// commands that change state instead of showing a page
+NAVI_ACTIONS = ("navigate", "set/", "buy/", "pw/new", "pw/edit/", "pw/del/", "cws/new", "cws/edit/", "cws/toggle/", "dlw/view/", "perf/export", "profile/use/", "cache/clear/")
+KV_KEYS = ('sites', 'extensions', 'settings', 'navits', 'inventory', 'last_active', 'last_reward', 'top_sites', 'session')
+PAGE_COLS = ('id', 'title', 'url', 'blob', 'kind', 'size', 'time')
+EARLY_KEYS = ('settings', 'navits', 'top_sites', 'session') # all the first window and new tab page need; the rest loads once the window is up
+TRACE_FILE = "navi_startup.jsonl"
+PERF_RING = 500 # page loads (and samples per timed call) kept for navi://perf
+PERF_FILE = "navi_perf.jsonl"
+# Sets window.__painted after the second animation frame, i.e. once the page has actually been painted
+PAINT_JS = "window.__painted = 0; requestAnimationFrame(() => requestAnimationFrame(() => window.__painted = 1));"
+
+# --- Startup Profile ---
+class StartupTrace:
+    """Startup phases as ms since T_START. With --profile-startup[=file] one JSON line per launch is
+    appended to the file once every phase in `waiting` has been reached."""
+    def __init__(self, t0):
+        self.t0, self.phases, self.path = t0, {}, None
+        self.waiting = {"first paint", "deferred init"}
+
+    def mark(self, phase):
+        self.phases[phase] = round((time.perf_counter() - self.t0) * 1e3, 1)
+        self.waiting.discard(phase)
+        if self.path and not self.waiting: self.save()
+
+    def save(self):
+        with open(self.path, "a") as f: f.write(json.dumps({'time': datetime.now().isoformat(timespec='seconds'), 'phases': self.phases}) + "\n")
+        print("startup: " + ", ".join(f"{k} {v:.0f}ms" for k, v in self.phases.items()))
+        self.path = None
+
+TRACE = StartupTrace(T_START)
+
+# --- Telemetry ---
+def pct(xs, p):
+    xs = sorted(xs); return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else 0
+
+class Telemetry:
+    """Data behind navi://perf: the last PERF_RING page loads and per-call timings of the Python hot paths,
+    both in fixed-size ring buffers so telemetry never grows with uptime."""
+    # Read back from the page once it has loaded: navigation timing, bytes on the wire and the slowest resources
+    TIMING_JS = """(() => {
+        const n = performance.getEntriesByType('navigation')[0] || {}, rs = performance.getEntriesByType('resource');
+        const all = [n, ...rs], cached = r => r.transferSize === 0 && r.decodedBodySize > 0;
+        return {ttfb: Math.round(n.responseStart || 0), dcl: Math.round(n.domContentLoadedEventEnd || 0), resources: rs.length,
+                bytes: all.reduce((s, r) => s + (r.transferSize || 0), 0), decoded: all.reduce((s, r) => s + (r.decodedBodySize || 0), 0),
+                cached: all.filter(cached).length,
+                slowest: rs.sort((a, b) => b.duration - a.duration).slice(0, 5).map(r => [r.name, Math.round(r.duration), r.transferSize || 0])};
+    })()"""
+
+    def __init__(self, size=PERF_RING):
+        self.size = size
+        self.loads = deque(maxlen=size)
+        self.costs = {} # name -> deque of ms
+
+    def cost(self, name, ms): self.costs.setdefault(name, deque(maxlen=self.size)).append(ms)
+
+    def page_loaded(self, b, ok):
+        if b.t_load is None: return
+        now, pid = time.perf_counter(), b.page().renderProcessPid()
+        r = {'time': time.time(), 'tab': b.tid, 'profile': b.page().profile().storageName(), 'url': b.url().toString(), 'ok': ok, 'ms': round((now - b.t_load) * 1e3, 1),
+             'first_ms': round((b.t_first - b.t_load) * 1e3, 1) if b.t_first else None, 'pid': pid, 'rss_mb': round(rss_mb(pid), 1)}
+        b.t_load = None; self.loads.append(r)
+        if ok: b.page().runJavaScript(self.TIMING_JS, QWebEngineScript.ScriptWorldId.ApplicationWorld.value, lambda v: r.update(v) if isinstance(v, dict) else None)
+
+    def export(self, path):
+        """Write every load record and a summary line per timed call as JSONL; returns the line count."""
+        lines = [dict(kind='load', **r) for r in self.loads]
+        lines += [{'kind': 'cost', 'name': k, 'calls': len(v), 'p50_ms': pct(v, .5), 'p95_ms': pct(v, .95), 'max_ms': max(v)} for k, v in self.costs.items()]
+        with open(path, "w") as f: f.writelines(json.dumps(x) + "\n" for x in lines)
+        return len(lines)
+
+PERF = Telemetry()
+
+def timed(name):
+    """Record each call's duration under `name` in PERF."""
+    def deco(f):
+        @functools.wraps(f)
+        def wrapper(*a, **k):
+            t0 = time.perf_counter()
+            try: return f(*a, **k)
+            finally: PERF.cost(name, (time.perf_counter() - t0) * 1e3)
+        return wrapper
+    return deco
 
 # --- Helper Functions ---
 def get_wholesome_history():
@@ -26,6 +187,8 @@ def get_wholesome_history():
         {"url": "https://www.youtube.com/watch?v=cute_kittens", "time": time.time() - 200, "title": "Kittens"},
     ]
 
+def navi_cmd(u): return u.lower().replace("navi://", "").replace("app://", "").strip("/")
+
 def get_search_url(engine, query):
     engines = {
         "Google": "https://www.google.com/search?q=",
@@ -37,9 +200,576 @@ def get_search_url(engine, query):
     }
     return engines.get(engine, engines["Google"]) + query.replace(" ", "+")
 
+# --- Profile Storage ---
+class NaviStore:
+    """SQLite (WAL) profile store. Writes are queued and committed in batches by a worker thread."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT);
+    CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT, visits INTEGER, last REAL);
+    CREATE INDEX IF NOT EXISTS urls_last ON urls (last);
+    CREATE TABLE IF NOT EXISTS pages (id TEXT PRIMARY KEY, title TEXT, url TEXT, blob TEXT, kind TEXT, size INTEGER, time REAL);
+    """
+    # Full-text index over history titles/urls, kept in sync with the urls table by triggers
+    FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS urls_fts USING fts5 (title, url, content='urls', content_rowid='id');
+    CREATE TRIGGER IF NOT EXISTS urls_ai AFTER INSERT ON urls BEGIN
+        INSERT INTO urls_fts (rowid, title, url) VALUES (new.id, new.title, new.url); END;
+    CREATE TRIGGER IF NOT EXISTS urls_ad AFTER DELETE ON urls BEGIN
+        INSERT INTO urls_fts (urls_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url); END;
+    CREATE TRIGGER IF NOT EXISTS urls_au AFTER UPDATE OF title ON urls WHEN old.title IS NOT new.title BEGIN
+        INSERT INTO urls_fts (urls_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+        INSERT INTO urls_fts (rowid, title, url) VALUES (new.id, new.title, new.url); END;
+    """
+    # One row per url: a revisit bumps the visit count instead of adding a duplicate row
+    VISIT = """INSERT INTO urls (url, title, visits, last) VALUES (?, ?, 1, ?)
+    ON CONFLICT (url) DO UPDATE SET visits = visits + 1, last = excluded.last, title = COALESCE(NULLIF(excluded.title, ''), title)"""
+
+    def __init__(self, path=DB_FILE, delay=FLUSH_DELAY):
+        self.path, self.delay = path, delay
+        self.q = queue.Queue()
+        self.db = self.connect(); self.db.executescript(self.SCHEMA)
+        try: self.db.executescript(self.FTS); self.fts = True
+        except sqlite3.OperationalError: self.fts = False # sqlite built without FTS5: search falls back to LIKE
+        self.w = threading.Thread(target=self.run, name="navi-store", daemon=True); self.w.start()
+
+    def connect(self):
+        c = sqlite3.connect(self.path)
+        c.execute("PRAGMA journal_mode=WAL"); c.execute("PRAGMA synchronous=NORMAL")
+        return c
+
+    # Write API (cheap on the GUI thread: values are snapshotted and queued)
+    def put(self, k, v): self.q.put(("kv", k, json.dumps(v)))
+    def add_hist(self, h): self.q.put(("hist", h['url'], h['title'], h['time']))
+    def set_hist(self, hs): self.q.put(("hist_all", [(h['url'], h['title'], h['time']) for h in reversed(hs)]))
+    def expire_hist(self, days): self.q.put(("expire", time.time() - days * 86400))
+    def add_dl(self, d): self.q.put(("dl",) + tuple(d[c] for c in PAGE_COLS))
+
+    def flush(self):
+        ev = threading.Event(); self.q.put(("sync", ev)); ev.wait()
+
+    def close(self):
+        if self.w.is_alive(): self.q.put(("stop",)); self.w.join()
+        self.db.close()
+
+    def run(self):
+        db = self.connect()
+        while True:
+            ops = [self.q.get()]; end = time.monotonic() + self.delay
+            while ops[-1][0] not in ("sync", "stop"):
+                try: ops.append(self.q.get(timeout=max(0, end - time.monotonic())))
+                except queue.Empty: break
+            while True:
+                try: ops.append(self.q.get_nowait())
+                except queue.Empty: break
+            try:
+                with db: # one transaction per batch, so a crash never leaves a half-written profile
+                    for op in ops: self.apply(db, op)
+            except sqlite3.Error as e: print(f"store: {e}")
+            for op in ops:
+                if op[0] == "sync": op[1].set()
+            if any(op[0] == "stop" for op in ops): break
+        db.close()
+
+    def apply(self, db, op):
+        kind = op[0]
+        if kind == "kv": db.execute("INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)", op[1:])
+        elif kind == "hist": db.execute(self.VISIT, op[1:])
+        elif kind == "hist_all": db.execute("DELETE FROM urls"); db.executemany(self.VISIT, op[1])
+        elif kind == "expire": db.execute("DELETE FROM urls WHERE last < ?", op[1:])
+        elif kind == "dl": db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", op[1:])
+
+    # Read API (GUI thread; WAL lets these run alongside the writer)
+    def load(self, keys=None):
+        """Profile data; with keys, just those kv entries (no saved pages)."""
+        if keys: return {k: json.loads(v) for k, v in self.db.execute(f"SELECT k, v FROM kv WHERE k IN ({','.join('?' * len(keys))})", keys)}
+        d = {k: json.loads(v) for k, v in self.db.execute("SELECT k, v FROM kv")}
+        if not d: return None
+        d['downloads'] = [dict(zip(PAGE_COLS, r)) for r in self.db.execute("SELECT * FROM pages ORDER BY time")]
+        return d
+
+    def query_hist(self, q="", before=None, limit=HIST_PAGE):
+        """Newest-first history rows, optionally full-text filtered; page with before=(time, id) of the previous page's last row.
+        The id breaks ties, e.g. between rows migrated from navi_data.json, which all have time 0."""
+        where, args = ["1"], []
+        if before is not None: where[0] = "(u.last, u.id) < (?, ?)"; args = list(before)
+        if q and self.fts:
+            where.append("u.id IN (SELECT rowid FROM urls_fts WHERE urls_fts MATCH ?)")
+            args.append(" ".join('"%s"*' % t.replace('"', '""') for t in q.split()))
+        elif q:
+            where.append("(u.title LIKE ? OR u.url LIKE ?)"); args += [f"%{q}%"] * 2
+        sql = f"SELECT u.url, u.title, u.visits, u.last, u.id FROM urls u WHERE {' AND '.join(where)} ORDER BY u.last DESC, u.id DESC LIMIT ?"
+        return [dict(zip(('url', 'title', 'visits', 'time', 'id'), r)) for r in self.db.execute(sql, args + [limit])]
+
+    def url_rows(self):
+        """Every history row as (url, title, visits, last), on a private connection so it can run off the GUI thread."""
+        self.flush(); c = self.connect()
+        try: return c.execute("SELECT url, title, visits, last FROM urls").fetchall()
+        finally: c.close()
+
+    def archive_rows(self, archive, dls):
+        """Move inlined page HTML into the archive, returning metadata-only rows for the pages table."""
+        rows = []
+        for x in dls:
+            data = (x.get('html') or '').encode()
+            rows.append((x['id'], x.get('title', ''), '', archive.put_now(data), 'html', len(data), float(x['id']) if x['id'].isdigit() else 0))
+        return rows
+
+    def migrate(self, path, archive):
+        """One-shot import of the old navi_data.json layout; the json file is kept as <path>.migrated."""
+        with open(path, 'r') as f: d = json.load(f)
+        with self.db:
+            for k in KV_KEYS:
+                if k in d: self.db.execute("INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)", (k, json.dumps(d[k])))
+            self.db.executemany(self.VISIT, [(h['url'], h.get('title', ''), h.get('time', 0)) for h in reversed(d.get('history', []))])
+            self.db.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", self.archive_rows(archive, d.get('downloads', [])))
+        os.replace(path, path + ".migrated")
+
+# --- Offline Page Archive ---
+class PageArchive:
+    """Saved pages as zlib-compressed blobs keyed by content hash, so saving the same page twice stores it once."""
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root; os.makedirs(root, exist_ok=True)
+        shutil.rmtree(os.path.join(root, "view"), ignore_errors=True) # MHTML unpacked for viewing by older versions
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="navi-archive")
+        self.pending = {}
+
+    def path(self, k): return os.path.join(self.root, k[:2], k + ".z")
+
+    def write(self, k, data):
+        p = self.path(k)
+        if os.path.exists(p): return
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        with open(p + ".tmp", 'wb') as f: f.write(zlib.compress(data, 6))
+        os.replace(p + ".tmp", p)
+
+    def put(self, data):
+        """Hash on the caller, compress and write on the worker thread; returns the blob key immediately."""
+        k = hashlib.sha256(data).hexdigest()
+        f = self.pool.submit(self.write, k, data); self.pending[k] = f
+        f.add_done_callback(lambda _, k=k: self.pending.pop(k, None))
+        return k
+
+    def put_now(self, data):
+        k = hashlib.sha256(data).hexdigest(); self.write(k, data); return k
+
+    def get(self, k):
+        f = self.pending.get(k)
+        if f: f.result()
+        with open(self.path(k), 'rb') as fh: return zlib.decompress(fh.read())
+
+    def close(self): self.pool.shutdown(wait=True)
+
+# --- Offline Assets ---
+class AssetCache(QObject):
+    """First-use disk cache for the new tab page's fonts, icons, backgrounds and top-site thumbnails, served from local://navi/assets/.
+
+    Until an asset is cached its remote url is used and a download is started in the background; `ready` fires
+    (on the GUI thread, via a queued connection) once something new is on disk. Thumbnails are grabbed on the GUI
+    thread but scaled and encoded on the same pool.
+    """
+    ready = pyqtSignal()
+    FONTS = ["https://fonts.googleapis.com/icon?family=Material+Icons", "https://fonts.googleapis.com/css2?family=Poppins:ital,wght@0,100;0,200;0,300;0,400;0,500;0,600;0,700;0,800;0,900;1,100;1,200;1,300;1,400;1,500;1,600;1,700;1,800;1,900&display=swap"]
+    THUMB = (300, 200) # sidebar grid cells at 2x
+    TILE = (320, 200) # top-site thumbnails at 2x
+    MIME = {"css": b"text/css", "woff2": b"font/woff2", "woff": b"font/woff", "ttf": b"font/ttf", "jpg": b"image/jpeg"}
+    UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36" # so Google Fonts serves woff2
+
+    def __init__(self, root=ASSET_DIR, budget=ASSET_BUDGET):
+        super().__init__()
+        self.root, self.budget = root, budget
+        self.screen = (1920, 1080)
+        for d in ("fonts", "bg", "thumbs"): os.makedirs(os.path.join(root, d), exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="navi-assets")
+        self.busy, self.lock = set(), threading.Lock() # busy is shared with the pool's workers
+
+    def fetch(self, url):
+        with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': self.UA}), timeout=10) as r: return r.read()
+
+    def write(self, p, data):
+        with open(p + ".tmp", 'wb') as f: f.write(data)
+        os.replace(p + ".tmp", p)
+
+    def submit(self, k, fn, *a):
+        # At most one download per asset; a failed one is simply retried the next time the asset is asked for
+        with self.lock:
+            if k in self.busy: return
+            self.busy.add(k)
+        def job():
+            try: fn(*a); self.ready.emit()
+            except (OSError, ValueError) as e: print(f"assets: {e}")
+            finally:
+                with self.lock: self.busy.discard(k)
+        self.pool.submit(job)
+
+    def fonts_css(self):
+        p = os.path.join(self.root, "fonts", "fonts.css")
+        if os.path.exists(p):
+            with open(p, 'rb') as f: return f.read()
+        self.submit("fonts", self.cache_fonts)
+        return "".join(f"@import url('{u}');" for u in self.FONTS).encode()
+
+    def cache_fonts(self):
+        css = ""
+        for u in self.FONTS:
+            c = self.fetch(u).decode()
+            for src in set(re.findall(r"url\((https://[^)]+)\)", c)):
+                name = hashlib.sha1(src.encode()).hexdigest() + os.path.splitext(src.split("?")[0])[1]
+                self.write(os.path.join(self.root, "fonts", name), self.fetch(src))
+                c = c.replace(src, f"local://navi/assets/fonts/{name}")
+            css += c
+        self.write(os.path.join(self.root, "fonts", "fonts.css"), css.encode())
+
+    def bg_url(self, src, size):
+        """Local url of a background downscaled to `size` ('thumb' or 'full'), or src while it is being cached."""
+        if not src.startswith(("http://", "https://")): return src
+        k = hashlib.sha1(src.encode()).hexdigest()
+        if os.path.exists(os.path.join(self.root, "bg", f"{k}-{size}.jpg")): return f"local://navi/assets/bg/{k}-{size}.jpg"
+        self.submit(k, self.cache_bg, src, k, self.screen)
+        return src
+
+    def cache_bg(self, src, k, screen):
+        img = QImage(); img.loadFromData(self.fetch(src))
+        if img.isNull(): raise ValueError(f"not an image: {src}")
+        for size, (w, h) in (("thumb", self.THUMB), ("full", screen)):
+            out = img.scaled(w, h, Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation) if img.width() > w and img.height() > h else img
+            ba = QByteArray(); buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly); out.save(buf, "JPG", 85); buf.close()
+            self.write(os.path.join(self.root, "bg", f"{k}-{size}.jpg"), ba.data())
+        self.evict()
+
+    def thumb_path(self, url): return os.path.join(self.root, "thumbs", hashlib.sha1(url.encode()).hexdigest() + ".jpg")
+
+    def thumb_url(self, url):
+        """Local url of a page's thumbnail, or None if there is none yet."""
+        p = self.thumb_path(url)
+        return f"local://navi/assets/thumbs/{os.path.basename(p)}" if os.path.exists(p) else None
+
+    def thumb_stale(self, url):
+        try: return time.time() - os.stat(self.thumb_path(url)).st_mtime > THUMB_MAX_AGE
+        except OSError: return True
+
+    def save_thumb(self, url, img):
+        """Scale, encode and store a grabbed page image in the background."""
+        self.submit("thumb:" + url, self.cache_thumb, img, self.thumb_path(url))
+
+    def cache_thumb(self, img, p):
+        w, h = self.TILE
+        out = img.scaled(w, h, Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation).copy(0, 0, w, h) # keep the top of the page
+        ba = QByteArray(); buf = QBuffer(ba); buf.open(QIODevice.OpenModeFlag.WriteOnly); out.save(buf, "JPG", 80); buf.close()
+        self.write(p, ba.data()); self.evict("thumbs", THUMB_BUDGET)
+
+    def evict(self, sub="bg", budget=None):
+        # Least recently served backgrounds go first (serve() bumps the mtime), oldest thumbnails likewise; fonts are small and always kept
+        # Both pool workers can evict at once, so a listed file may already be gone; .tmp files are writes in flight
+        d, budget, files = os.path.join(self.root, sub), budget or self.budget, []
+        for n in os.listdir(d):
+            if n.endswith(".tmp"): continue
+            try: st = os.stat(os.path.join(d, n))
+            except FileNotFoundError: continue
+            files.append((st.st_mtime, st.st_size, os.path.join(d, n)))
+        files.sort(); total = sum(f[1] for f in files)
+        for _, size, p in files:
+            if total <= budget: break
+            try: os.remove(p)
+            except FileNotFoundError: pass
+            total -= size
+
+    def serve(self, path):
+        """(mime, body) for local://navi/assets/<path>, or None."""
+        if path == "fonts.css": return (self.MIME["css"], self.fonts_css())
+        d, _, name = path.partition("/")
+        p = os.path.join(self.root, d, name)
+        if d not in ("fonts", "bg", "thumbs") or name != os.path.basename(name) or not os.path.isfile(p): return None
+        try:
+            if d == "bg": os.utime(p)
+            with open(p, 'rb') as f: return (self.MIME.get(name.rsplit(".", 1)[-1], b"application/octet-stream"), f.read())
+        except FileNotFoundError: return None # evicted since the isfile check
+
+    def close(self): self.pool.shutdown(wait=False, cancel_futures=True)
+
+# --- Local Sites ---
+class SiteBundles:
+    """Local sites as directories under SITE_DIR, served as local://<site>/<path>; directories serve their index.html.
+
+    Only metadata (title) stays in the profile. Files are read whole and the hot ones kept in an LRU of up to
+    `budget` bytes, revalidated against size and mtime on every hit so files edited on disk show up on the next load.
+    """
+    INDEX = "index.html"
+    MAX_FILE = 4 * 1048576 # bigger files are re-read from disk on every request rather than cached, so one video can't flush the cache
+
+    def __init__(self, root=SITE_DIR, budget=SITE_CACHE):
+        self.root, self.budget = root, budget
+        os.makedirs(root, exist_ok=True)
+        self.lru, self.size = OrderedDict(), 0
+        self.hits = self.misses = 0
+
+    def dir(self, site): return os.path.join(self.root, site)
+
+    def path(self, site, rel=""):
+        """Filesystem path of `rel` inside a site's bundle, or None if it would point outside of it."""
+        rel = os.path.normpath(rel.strip("/") or ".")
+        if rel == ".." or rel.startswith(".." + os.sep) or os.path.isabs(rel) or site in ("", ".", "..") or site != os.path.basename(site): return None
+        return os.path.join(self.root, site, rel)
+
+    def serve(self, site, rel):
+        """(mime, body) for local://<site>/<rel>, or None."""
+        p = self.path(site, rel)
+        if p and os.path.isdir(p): p = os.path.join(p, self.INDEX)
+        try: st = os.stat(p) if p else None
+        except OSError: return None
+        if not st: return None
+        ver, e = (st.st_size, st.st_mtime_ns), self.lru.get(p)
+        if e and e[0] == ver: self.lru.move_to_end(p); self.hits += 1; return e[1], e[2]
+        self.misses += 1
+        with open(p, 'rb') as f: mime, body = (mimetypes.guess_type(p)[0] or "application/octet-stream").encode(), f.read()
+        if st.st_size <= self.MAX_FILE: self.put(p, (ver, mime, body))
+        return mime, body
+
+    def put(self, p, e):
+        old = self.lru.pop(p, None)
+        if old: self.size -= len(old[2])
+        self.lru[p] = e; self.size += len(e[2])
+        while self.size > self.budget: self.size -= len(self.lru.popitem(last=False)[1][2])
+
+    def drop(self, site):
+        d = self.dir(site) + os.sep
+        for p in [p for p in self.lru if p.startswith(d)]: self.size -= len(self.lru.pop(p)[2])
+
+    def index(self, site):
+        """The site's index.html as text ('' for a new site)."""
+        try:
+            with open(os.path.join(self.dir(site), self.INDEX), encoding="utf-8") as f: return f.read()
+        except OSError: return ""
+
+    def save_index(self, site, text):
+        d = self.dir(site); os.makedirs(d, exist_ok=True); p = os.path.join(d, self.INDEX)
+        with open(p + ".tmp", 'w', encoding="utf-8") as f: f.write(text)
+        os.replace(p + ".tmp", p); self.drop(site)
+
+    def remove(self, site): shutil.rmtree(self.dir(site), ignore_errors=True); self.drop(site)
+
+    def migrate(self, sites):
+        """Moves html_content kept in the profile by older versions into bundles. True if any site changed."""
+        old = [k for k, v in sites.items() if 'html_content' in v]
+        for k in old: self.save_index(k, sites[k].pop('html_content'))
+        return bool(old)
+
+# --- Content Blocker ---
+def base_domain(host):
+    # Good enough for third-party checks without a public suffix list: a.b.example.com -> example.com
+    return ".".join(host.rsplit(".", 2)[-2:])
+
+def host_suffixes(host):
+    while True:
+        yield host
+        i = host.find(".")
+        if i < 0: return
+        host = host[i + 1:]
+
+class FilterSet:
+    """One side (block or exception) of a compiled filter list. A rule is (kind, arg, options) with options
+    (third_party, type_mask, exclude_mask, domains, not_domains, match_case). Rules anchored to a host (`||host^`,
+    `||host/path`) are looked up per host suffix; the rest live under their rarest token (looked up per url token)
+    or, tokenless, in generic. Kinds: HOST (no arg), PATH (arg is a path prefix), TEXT (substring), REGEX."""
+    HOST, PATH, TEXT, REGEX = range(4)
+
+    def __init__(self, data=None):
+        self.hosts, self.tokens, self.generic = data or ({}, {}, [])
+        self.res = {} # compiled regexes, built on first use
+
+    def data(self): return self.hosts, self.tokens, self.generic
+
+    def regex(self, src, case):
+        rx = self.res.get(src)
+        if rx is None: rx = self.res[src] = re.compile(src, 0 if case else re.IGNORECASE)
+        return rx
+
+    def warm(self):
+        # Compiling the (few) regex rules up front keeps the first request that needs one from paying for it
+        for rs in (*self.hosts.values(), *self.tokens.values(), self.generic):
+            for kind, arg, opts in rs:
+                if kind == self.REGEX: self.regex(arg, opts[5])
+
+    def ok(self, r, url, low, path, origin, third, bit):
+        kind, arg, (tp, inc, exc, doms, ndoms, case) = r
+        if tp is not None and tp != third: return False
+        if inc and not inc & bit or exc & bit: return False
+        if doms or ndoms:
+            sfx = set(host_suffixes(origin))
+            if doms and not sfx & doms or ndoms and sfx & ndoms: return False
+        if kind == self.HOST: return True
+        s = url if case else low
+        if kind == self.PATH: return s.startswith(arg, path)
+        if kind == self.TEXT: return arg in s
+        return self.regex(arg, case).search(s) is not None
+
+    def hit(self, url, low, path, host, origin, third, bit):
+        for h in host_suffixes(host):
+            for r in self.hosts.get(h, ()):
+                if self.ok(r, url, low, path, origin, third, bit): return True
+        for t in set(FilterIndex.TOKEN.findall(low)):
+            for r in self.tokens.get(t, ()):
+                if self.ok(r, url, low, path, origin, third, bit): return True
+        return any(self.ok(r, url, low, path, origin, third, bit) for r in self.generic)
+
+class FilterIndex:
+    """EasyList-style network filters compiled for matching in microseconds. Cosmetic (##) rules, regex rules and
+    rules with options we can't honour (popup, csp, redirect, ...) are skipped."""
+    VERSION = 1
+    TOKEN = re.compile(r"[a-z0-9%]{3,}")
+    TYPES = {n: 1 << i for i, n in enumerate(("document", "subdocument", "script", "stylesheet", "image", "font", "media",
+                                                "object", "xmlhttprequest", "ping", "websocket", "other"))}
+    ALIASES = {"xhr": "xmlhttprequest", "frame": "subdocument", "css": "stylesheet", "1p": "~third-party", "3p": "third-party",
+               "first-party": "~third-party", "object-subrequest": "object"}
+
+    def __init__(self, block=None, allow=None):
+        self.block, self.allow = FilterSet(block), FilterSet(allow)
+        self.rules = sum(len(v) for s in (self.block, self.allow) for v in (*s.hosts.values(), *s.tokens.values(), s.generic))
+
+    def match(self, url, host, origin, rtype):
+        """True if a request for `url` (on `host`) made by a page on `origin` should be blocked."""
+        low, third, bit = url.lower(), base_domain(host) != base_domain(origin), self.TYPES.get(rtype, self.TYPES["other"])
+        a = low.find("://") + 3; path = min((i for i in (low.find(c, a) for c in "/?#") if i >= 0), default=len(low))
+        return self.block.hit(url, low, path, host, origin, third, bit) and not self.allow.hit(url, low, path, host, origin, third, bit)
+
+    @classmethod
+    def parse(cls, line):
+        """(is_exception, host | None, rule, token candidates) for one filter line, or None to skip it."""
+        line = line.strip()
+        if not line or line[0] in "![" or "#" in line and re.search(r"#[@?$]*#", line): return None
+        allow = line.startswith("@@")
+        if allow: line = line[2:]
+        pat, opts = line, ""
+        if "$" in line and re.fullmatch(r"[\w~=|.,*-]+", line.rpartition("$")[2]): pat, _, opts = line.rpartition("$")
+        if len(pat) > 1 and pat[0] == pat[-1] == "/": return None
+        tp, inc, exc, doms, ndoms, case = None, 0, 0, set(), set(), False
+        for o in filter(None, opts.lower().split(",")):
+            o = cls.ALIASES.get(o, o); neg = o.startswith("~"); name = o.lstrip("~")
+            if name == "third-party": tp = not neg
+            elif name in cls.TYPES:
+                if neg: exc |= cls.TYPES[name]
+                else: inc |= cls.TYPES[name]
+            elif name.startswith("domain="):
+                for d in name[7:].split("|"): (ndoms if d.startswith("~") else doms).add(d.lstrip("~"))
+            elif name == "match-case": case = True
+            else: return None
+        options = (tp, inc, exc, frozenset(doms), frozenset(ndoms), case)
+        if not case: pat = pat.lower()
+        m = re.fullmatch(r"\|\|([a-z0-9.-]+)(?:\^\|?|(/[^*^|]*)\*?)?", pat, re.IGNORECASE)
+        if m: return allow, m.group(1).lower(), (FilterSet.PATH, m.group(2), options) if m.group(2) else (FilterSet.HOST, None, options), ()
+        start = "||" if pat.startswith("||") else "|" if pat.startswith("|") else ""
+        body = pat[len(start):]; end = body.endswith("|")
+        if end: body = body[:-1]
+        if not start and not end and not re.search(r"[*^|]", body.strip("*")):
+            body = body.strip("*"); rule = (FilterSet.TEXT, body, options)
+        else:
+            rx = re.escape(body).replace(r"\*", ".*").replace(r"\^", r"(?:[^\w.%-]|$)")
+            rule = (FilterSet.REGEX, {"||": r"^[a-z][a-z0-9.+-]*://(?:[^/?#]*\.)?", "|": "^", "": ""}[start] + rx + ("$" if end else ""), options)
+        # A token is only usable if the url tokenizer would see exactly it: not cut off by a wildcard or an unanchored edge
+        low = body.lower(); cands = []
+        for t in cls.TOKEN.finditer(low):
+            a, b = t.span()
+            if (a > 0 and low[a - 1] != "*" or a == 0 and start) and (b < len(low) and low[b] != "*" or b == len(low) and end):
+                cands.append(t.group())
+        return allow, None, rule, cands
+
+    @classmethod
+    def compile(cls, lines):
+        parsed = [p for p in map(cls.parse, lines) if p]
+        freq = {}
+        for p in parsed:
+            for t in p[3]: freq[t] = freq.get(t, 0) + 1
+        sides = {False: ({}, {}, []), True: ({}, {}, [])}
+        for allow, host, rule, cands in parsed:
+            hosts, tokens, generic = sides[allow]
+            if host: hosts.setdefault(host, []).append(rule)
+            elif cands: tokens.setdefault(min(cands, key=lambda t: (freq[t], -len(t))), []).append(rule)
+            else: generic.append(rule)
+        return cls(sides[False], sides[True])
+
+    def save(self, path, key):
+        with open(path + ".tmp", "wb") as f: pickle.dump((self.VERSION, key, self.block.data(), self.allow.data()), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, key):
+        """The index saved at `path` if it was compiled from the same lists (same key), else None."""
+        try:
+            with open(path, "rb") as f: v, k, block, allow = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError): return None
+        return cls(block, allow) if (v, k) == (cls.VERSION, key) else None
+
+class ContentBlocker(QObject):
+    """Keeps a FilterIndex for the lists in FILTER_DIR: the compiled index is pickled next to them and reused as long as
+    the lists are unchanged, stale default lists are re-downloaded in the background, and `ready` fires on each new index."""
+    ready = pyqtSignal()
+    LISTS = {"easylist.txt": "https://easylist.to/easylist/easylist.txt", "easyprivacy.txt": "https://easylist.to/easylist/easyprivacy.txt"}
+
+    def __init__(self, root=FILTER_DIR):
+        super().__init__()
+        self.root = root; os.makedirs(root, exist_ok=True)
+        self.index, self.allow = None, set()
+
+    def key(self): return sorted((n, os.path.getsize(p), os.path.getmtime(p)) for n in os.listdir(self.root) if n.endswith(".txt") for p in [os.path.join(self.root, n)])
+
+    def build(self):
+        path, key = os.path.join(self.root, "index.pkl"), self.key()
+        idx = FilterIndex.load(path, key)
+        if idx is None:
+            lines = []
+            for n, *_ in key:
+                with open(os.path.join(self.root, n), encoding="utf-8", errors="replace") as f: lines += f.read().splitlines()
+            idx = FilterIndex.compile(lines); idx.save(path, key)
+        idx.block.warm(); idx.allow.warm()
+        self.index = idx; self.ready.emit()
+
+    def stale(self, n):
+        p = os.path.join(self.root, n)
+        return not os.path.exists(p) or time.time() - os.path.getmtime(p) > FILTER_MAX_AGE
+
+    def start(self):
+        """Load the saved index (or compile the lists), then refresh stale default lists; all off the GUI thread."""
+        def job():
+            try:
+                if self.key(): self.build()
+                stale = [n for n in self.LISTS if self.stale(n)]
+                for n in stale:
+                    with urllib.request.urlopen(self.LISTS[n], timeout=30) as r: data = r.read()
+                    p = os.path.join(self.root, n)
+                    with open(p + ".tmp", "wb") as f: f.write(data)
+                    os.replace(p + ".tmp", p)
+                if stale: self.build()
+            except (OSError, ValueError) as e: print(f"blocker: {e}")
+        threading.Thread(target=job, name="navi-blocker", daemon=True).start()
+
+    def allowed(self, host): return any(h in self.allow for h in host_suffixes(host))
+
+class TabBlocker(QWebEngineUrlRequestInterceptor):
+    """Per-page request interceptor, so blocked requests can be counted per tab."""
+    T = QWebEngineUrlRequestInfo.ResourceType
+    TYPES = {T.ResourceTypeSubFrame: "subdocument", T.ResourceTypeScript: "script", T.ResourceTypeStylesheet: "stylesheet",
+             T.ResourceTypeImage: "image", T.ResourceTypeFavicon: "image", T.ResourceTypeFontResource: "font", T.ResourceTypeMedia: "media",
+             T.ResourceTypeObject: "object", T.ResourceTypePluginResource: "object", T.ResourceTypeXhr: "xmlhttprequest",
+             T.ResourceTypePing: "ping", T.ResourceTypeCspReport: "ping", T.ResourceTypeWebSocket: "websocket"}
+
+    def __init__(self, tab):
+        super().__init__(tab)
+        self.tab = tab
+
+    @timed("blocker")
+    def interceptRequest(self, info):
+        m = self.tab.main; idx = m.blocker.index
+        if not idx or not m.data['settings']['adblock'] or info.resourceType() == self.T.ResourceTypeMainFrame: return
+        u, origin = info.requestUrl(), info.firstPartyUrl().host()
+        if u.scheme() not in ("http", "https", "ws", "wss") or m.blocker.allowed(origin): return
+        if idx.match(u.toString(), u.host(), origin, self.TYPES.get(info.resourceType(), "other")):
+            info.block(True); self.tab.blocked += 1; self.tab.blocked_total += 1
+
 # --- UI Styling ---
 class BrowserStyles:
+    """Theme for the browser chrome as (background colour, toolbar stylesheet, tab bar stylesheet). The sheets go on the
+    toolbar and tab bar only: a stylesheet on the window would re-polish every widget below it, web views included."""
     @staticmethod
+    @functools.lru_cache(maxsize=None) # one compiled theme per (theme, mode)
     def get(theme, engine_mode):
         c = {
             "light": {"bg": "#f8f9fa", "fg": "#212529", "tab": "#ffffff", "sel": "#e9ecef", "bar": "#ffffff", "acc": "#0d6efd", "border": "#dee2e6"},
@@ -58,66 +788,92 @@ class BrowserStyles:
         bar_border = "0px" if engine_mode == "modern" else f"1px solid {c['border']}"
         font = "'Poppins', sans-serif" if engine_mode == "modern" else "'Segoe UI', sans-serif"
 
-        return f"""
-        QMainWindow {{ background-color: {c['bg']}; color: {c['fg']}; }}
-        QWidget {{ color: {c['fg']}; font-family: {font}; }}
-        QTabWidget::pane {{ border: 0; background: {c['bg']}; }}
-        QTabBar::tab {{ background: {c['tab']}; color: {c['fg']}; padding: {padding}; border-top-left-radius: {radius}; border-top-right-radius: {radius}; margin-right: {margin}; font-size: 13px; }}
-        QTabBar::tab:selected {{ background: {c['sel']}; font-weight: bold; border-bottom: 3px solid {c['acc']}; }}
+        return c['bg'], f"""
         QToolBar {{ background: {c['bar']}; border-bottom: 1px solid {c['border']}; spacing: 8px; padding: 6px; }}
+        QWidget {{ color: {c['fg']}; font-family: {font}; }}
         QLineEdit {{ background: {c['bg']}; border: 1px solid {c['border']}; border-radius: {radius}; padding: 8px 15px; color: {c['fg']}; font-size: 14px; }}
         QLineEdit:focus {{ border: 1px solid {c['acc']}; }}
         QPushButton {{ background-color: transparent; border-radius: 6px; padding: 6px; color: {c['fg']}; font-weight: bold; font-size: 16px; border: {bar_border}; }}
         QPushButton:hover {{ background-color: {c['tab']}; }}
-        QMenu {{ background: {c['bar']}; color: {c['fg']}; border: 1px solid {c['border']}; }}
-        QMenu::item:selected {{ background: {c['acc']}; color: #fff; }}
+        QAbstractItemView {{ background: {c['bar']}; color: {c['fg']}; border: 1px solid {c['border']}; selection-background-color: {c['acc']}; }}
+        """, f"""
+        QTabBar {{ background: {c['bg']}; font-family: {font}; }}
+        QTabBar::tab {{ background: {c['tab']}; color: {c['fg']}; padding: {padding}; border-top-left-radius: {radius}; border-top-right-radius: {radius}; margin-right: {margin}; font-size: 13px; }}
+        QTabBar::tab:selected {{ background: {c['sel']}; font-weight: bold; border-bottom: 3px solid {c['acc']}; }}
         """
 
 # --- Internal Pages Generator ---
 class InternalPages:
+    BACKGROUNDS = [
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR5hNaF09ykqTB3f7Vh0bjIdZwnjP8zgLK3ltDyjk91Fw&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRX-_RMHWqoAs6PkpHB9N0Lbar1hOTmJLDaK1ExfZiVJA&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ7aaASVlsLNoAIyXAlkAy3CInHuYaejCIRrYcwo8ZWSQ&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTyigMXGvP60gWjZ8W5W4sMfcYTe303m5u3pViEeVjjuw&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTHb8KtmhdnOBZey7jZ_SJxIN0xheUbuuy28QjCB4kXfQ&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTAakSD_9_vTzNUvHm0_FACBw_Bk3-oJoA1ySd2pPOOfw&s=10',
+        'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQHcTxQ_JwawDivZOCGADoK2E7biH6YwoZ4vlhn7cSTTw&s=10',
+        'https://plus.unsplash.com/premium_photo-1733306435632-9860ace48cb9?fm=jpg&q=60&w=3000&ixlib=rb-4.1.0&ixid=M3wxMjA3fDB8MHxzZWFyY2h8MXx8b3V0ZXIlMjBoZWJyaWRlc3xlbnwwfHwwfHx8MA%3D%3D',
+    ]
+
+    # Theme-independent rules; colours come from the variables in theme_vars, so a theme switch only swaps those
+    CSS = """
+        body { font-family: 'Poppins', sans-serif; background: var(--bg); color: var(--text); padding: 40px; margin: 0; }
+        .container { max-width: 900px; margin: 0 auto; }
+        h1 { color: #0d6efd; }
+        .card { background: var(--card); padding: 25px; border-radius: var(--radius); margin-bottom: 20px; border: 1px solid var(--border); }
+        .btn { padding: 8px 16px; background: #0d6efd; color: white; border: none; border-radius: 6px; text-decoration: none; cursor: pointer; display: inline-block; margin-right: 5px; }
+        .btn:hover { background: #0b5ed7; }
+        .btn-danger { background: #dc3545; }
+        .btn-gold { background: #ffc107; color: #000; }
+        .widget-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; }
+        input, select { padding: 10px; border-radius: 6px; border: 1px solid var(--border); background: var(--bg); color: var(--text); width: 100%; box-sizing: border-box; }
+        """
+
     @staticmethod
-    def css(theme):
+    @functools.lru_cache(maxsize=None)
+    def theme_vars(theme, mode):
         is_dark = theme != "light"
         bg = "#2b3035" if is_dark else "#f8f9fa"
         card_bg = "#343a40" if is_dark else "#ffffff"
         text = "#f8f9fa" if is_dark else "#212529"
         border = "#495057" if is_dark else "#dee2e6"
-        return f"""
-        body {{ font-family: 'Poppins', sans-serif; background: {bg}; color: {text}; padding: 40px; margin: 0; }}
-        .container {{ max-width: 900px; margin: 0 auto; }}
-        h1 {{ color: #0d6efd; }}
-        .card {{ background: {card_bg}; padding: 25px; border-radius: 12px; margin-bottom: 20px; border: 1px solid {border}; }}
-        .btn {{ padding: 8px 16px; background: #0d6efd; color: white; border: none; border-radius: 6px; text-decoration: none; cursor: pointer; display: inline-block; margin-right: 5px; }}
-        .btn:hover {{ background: #0b5ed7; }}
-        .btn-danger {{ background: #dc3545; }}
-        .btn-gold {{ background: #ffc107; color: #000; }}
-        .widget-grid {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; }}
-        input, select {{ padding: 10px; border-radius: 6px; border: 1px solid {border}; background: {bg}; color: {text}; width: 100%; box-sizing: border-box; }}
-        """
+        radius = "12px" if mode == "modern" else "0px"
+        return f":root {{ --bg: {bg}; --card: {card_bg}; --text: {text}; --border: {border}; --radius: {radius}; }}"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def theme_js(theme, mode):
+        # Restyles an already open internal page in place
+        return f"(document.getElementById('navi-theme') || {{}}).textContent = {json.dumps(InternalPages.theme_vars(theme, mode))};"
 
     @staticmethod
-    def new_tab(data):
+    def new_tab(data, assets):
         s = data['settings']
         navits = data['navits']
         
         # User requested background
         if s.get('bg_url') and not s['bg_url'].startswith('#'):
-            bg_style = f"background-image: url('{s['bg_url']}');"
+            bg_style = f"background-image: url('{assets.bg_url(s['bg_url'], 'full')}');"
         else:
             bg_style = f"background-color: {s.get('bg_url', '#222222')};"
 
         navit_display = f'<span class="btn btn-gold" style="position: absolute; top: 20px; right: 20px;">🪙 {navits}</span>'
 
+        # Most visited: thumbnails are only linked if already on disk, so rendering never waits on image work
+        tiles = ""
+        for u, t in data['top_sites']:
+            host = QUrl(u).host().removeprefix("www."); th = assets.thumb_url(u)
+            pic = f'<img src="{th}" alt="">' if th else f'<span class="letter">{html.escape(host[:1].upper())}</span>'
+            tiles += f'<a href="{html.escape(u)}" class="top-site" title="{html.escape(t or u)}">{pic}<span class="name">{html.escape(t or host)}</span></a>'
+
         return f"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <title>New Tab</title>
-    <link href="https://fonts.googleapis.com/icon?family=Material+Icons" rel="stylesheet">
+    <link href="local://navi/assets/fonts.css" rel="stylesheet">
     <style>
-        @import url('https://fonts.googleapis.com/css2?family=Poppins:ital,wght@0,100;0,200;0,300;0,400;0,500;0,600;0,700;0,800;0,900;1,100;1,200;1,300;1,400;1,500;1,600;1,700;1,800;1,900&display=swap');
-        
         body {{ {bg_style} background-size: cover; background-position: center; color: #FFFFFF; font-family: "Poppins", serif; margin: 0; padding: 0; display: flex; justify-content: center; align-items: center; height: 100vh; flex-direction: column; transition: background-image 0.5s ease; }}
         
         .container {{ text-align: center; position: relative; max-width: 900px; width: 95%; display: flex; flex-direction: column; align-items: center; }}
@@ -149,19 +905,16 @@ class InternalPages:
         .mini-card {{ background: rgba(51,51,51,0.7); backdrop-filter: blur(5px); padding: 15px; border-radius: 12px; text-align: center; color: white; text-decoration: none; transition: 0.2s; display: flex; flex-direction: column; align-items: center; justify-content: center; min-height: 80px; }}
         .mini-card:hover {{ background: rgba(0,0,0,0.5); transform: translateY(-3px); }}
         
+        .top-grid {{ display: grid; grid-template-columns: repeat(4, 1fr); gap: 12px; width: 100%; max-width: 700px; }}
+        .top-site {{ background: rgba(51,51,51,0.7); backdrop-filter: blur(5px); border-radius: 12px; overflow: hidden; color: white; text-decoration: none; transition: 0.2s; display: flex; flex-direction: column; }}
+        .top-site:hover {{ transform: translateY(-3px); box-shadow: 0 0 15px rgba(0,0,0,0.5); }}
+        .top-site img, .top-site .letter {{ width: 100%; aspect-ratio: 16 / 10; object-fit: cover; display: flex; align-items: center; justify-content: center; font-size: 2em; background: rgba(0,0,0,0.3); }}
+        .top-site .name {{ padding: 6px 8px; font-size: 0.8em; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }}
+
         .btn-gold {{ background: #ffc107; color: #000; padding: 8px 15px; border-radius: 20px; text-decoration: none; font-weight: bold; }}
     </style>
     <script>
-        const backgrounds = [
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR5hNaF09ykqTB3f7Vh0bjIdZwnjP8zgLK3ltDyjk91Fw&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRX-_RMHWqoAs6PkpHB9N0Lbar1hOTmJLDaK1ExfZiVJA&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ7aaASVlsLNoAIyXAlkAy3CInHuYaejCIRrYcwo8ZWSQ&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTyigMXGvP60gWjZ8W5W4sMfcYTe303m5u3pViEeVjjuw&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTHb8KtmhdnOBZey7jZ_SJxIN0xheUbuuy28QjCB4kXfQ&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTAakSD_9_vTzNUvHm0_FACBw_Bk3-oJoA1ySd2pPOOfw&s=10',
-            'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQHcTxQ_JwawDivZOCGADoK2E7biH6YwoZ4vlhn7cSTTw&s=10',
-            'https://plus.unsplash.com/premium_photo-1733306435632-9860ace48cb9?fm=jpg&q=60&w=3000&ixlib=rb-4.1.0&ixid=M3wxMjA3fDB8MHxzZWFyY2h8MXx8b3V0ZXIlMjBoZWJyaWRlc3xlbnwwfHwwfHx8MA%3D%3D'
-        ];
+        const backgrounds = {json.dumps([[assets.bg_url(u, 'thumb'), u] for u in InternalPages.BACKGROUNDS])}; // [shown, original]
         
         function handleSearch(e) {{
             if (e.key === 'Enter') window.location.href = 'app://navigate?url=' + encodeURIComponent(e.target.value);
@@ -173,8 +926,8 @@ class InternalPages:
             const grid = document.querySelector('.background-grid');
             backgrounds.forEach(bg => {{
                 const div = document.createElement('div'); div.className = 'background-option';
-                div.style.backgroundImage = `url('${{bg}}')`;
-                div.onclick = () => setBg(bg);
+                div.style.backgroundImage = `url('${{bg[0]}}')`;
+                div.onclick = () => setBg(bg[1]);
                 grid.appendChild(div);
             }});
             document.querySelector('.search-box').focus();
@@ -195,6 +948,7 @@ class InternalPages:
     <div class="container">
         <h1>New Tab</h1>
         <input type="text" class="search-box" placeholder="Search or enter URL" onkeypress="handleSearch(event)">
+        <div class="top-grid">{tiles}</div>
         
         <!-- Restored Feature Grid -->
         <div class="widget-grid">
@@ -209,15 +963,188 @@ class InternalPages:
     <small class="credit">Original HTML by cursorhex on github</small>
 
 <style>
-.credit {
+.credit {{
   font-size: 0.6rem;
   opacity: 0.6;
-}
+}}
 </style>
 </body>
 </html>
 """
 
+# --- Internal Pages Router ---
+class InternalRouter:
+    """Renders navi:// and local:// pages for NaviSchemeHandler.
+
+    Rendered pages are cached per page and only re-rendered once a profile key they depend on has been touched
+    (NaviBrowser.save_data touches the keys it writes). Pages driven by query parameters are never cached.
+    """
+    DEPS = {'home': ('settings', 'navits', 'assets', 'top_sites'), 'settings': ('settings', 'inventory', 'blocker'), 'store': ('settings', 'navits', 'inventory'),
+            'pw': ('settings', 'sites'), 'cws': ('settings', 'extensions'), 'dlw': ('settings', 'downloads')}
+
+    def __init__(self, main):
+        self.main = main
+        self.revs = {}; self.cache = {}
+        self.hits = self.misses = 0
+
+    def touch(self, *keys):
+        for k in keys: self.revs[k] = self.revs.get(k, 0) + 1
+
+    @timed("route")
+    def route(self, url):
+        """(mime, body) for an internal url, or None if there is no such page."""
+        host, path = url.host().lower(), url.path().strip("/")
+        if url.scheme() == "local":
+            if host == "navi": return self.main.assets.serve(path[7:]) if path.startswith("assets/") else self.cached('home')
+            return self.main.sites.serve(host, url.path(QUrl.ComponentFormattingOption.FullyDecoded))
+        if host in ("home", "newtab"): return self.cached('home')
+        if host in self.DEPS and not path: return self.cached(host)
+        if host == "history": return (b"text/html", self.history(url).encode())
+        if host == "tabs": return (b"text/html", self.tabs().encode())
+        if host == "perf": return (b"text/html", self.perf().encode())
+        if host == "cache": return (b"text/html", self.cache_page().encode())
+        if host == "archive":
+            # MHTML only renders from a file (see view_dl); served here it would be parsed as HTML
+            p = next((x for x in self.main.data['downloads'] if x['id']==path and x['kind']=="html"), None)
+            # After any doctype, so the page keeps its rendering mode
+            return (b"text/html", re.sub(rb"^(\s*<!doctype[^>]*>)?", lambda m: m.group(0) + ARCHIVE_CSP, self.main.archive.get(p['blob']), count=1, flags=re.I)) if p else None
+        return None
+
+    def key(self, name): return tuple(self.revs.get(k, 0) for k in self.DEPS[name])
+
+    def cached(self, name):
+        key = self.key(name)
+        hit = self.cache.get(name)
+        if hit and hit[0] == key: self.hits += 1; return hit[1]
+        self.misses += 1
+        r = (b"text/html", getattr(self, name)().encode()); self.cache[name] = (key, r)
+        return r
+
+    def wrap(self, body):
+        st = self.main.data['settings']
+        return f"<html><head><style id='navi-theme'>{InternalPages.theme_vars(st['theme'], st.get('mode', 'modern'))}</style><style>{InternalPages.CSS}</style></head><body><div class='container'>{body}</div></body></html>"
+
+    def home(self): return InternalPages.new_tab(self.main.data, self.main.assets)
+
+    def settings(self):
+        st = self.main.data['settings']
+        engines = "".join([f"<option {'selected' if e==st['engine'] else ''}>{e}</option>" for e in ["Google","Bing","Yahoo","DuckDuckGo","Ecosia","Yandex"]])
+        themes = "".join([f"<a href='navi://set/theme/{t}' class='btn' style='margin:5px'>{t.title()}</a>" for t in ["light","dark","cyberpunk","sunset","matrix"] if t in ["light","dark"] or t in self.main.data['inventory']])
+        m_l = "checked" if st.get('mode')=="legacy" else ""; m_m = "checked" if st.get('mode')=="modern" else ""
+        hist_days = "".join([f"<option value={d} {'selected' if d==st['hist_days'] else ''}>{n}</option>" for d, n in [(0,"Keep forever"),(30,"Keep 30 days"),(90,"Keep 90 days"),(365,"Keep 1 year")]])
+        return self.wrap(f"""<div class="card"><h1>Settings</h1>
+            <h3>🎨 Visuals</h3>
+            <p><b>Engine Mode:</b> <label><input type="radio" name="m" {m_m} onclick="window.location='navi://set/mode/modern'"> Modern</label> <label><input type="radio" name="m" {m_l} onclick="window.location='navi://set/mode/legacy'"> Legacy</label></p>
+            <p>{themes}</p>
+            <h3>🔍 Search</h3><select onchange="window.location='navi://set/engine/'+this.value">{engines}</select>
+            <h3>🔗 Suffix</h3><input value="{st['suffix']}" onchange="window.location='navi://set/suffix/'+this.value">
+            <h3>🕘 History</h3><select onchange="window.location='navi://set/histdays/'+this.value">{hist_days}</select>
+            <h3>🗂️ Tabs</h3><p>Keep at most <input type="number" min="1" style="width:80px" value="{st['tab_budget']}" onchange="window.location='navi://set/tabbudget/'+this.value"> tabs loaded,
+            using at most <input type="number" min="0" style="width:100px" value="{st['mem_budget']}" onchange="window.location='navi://set/membudget/'+this.value"> MB (0 = no limit).
+            Keep <input type="number" min="0" max="4" style="width:80px" value="{st['tab_pool']}" onchange="window.location='navi://set/tabpool/'+this.value"> new tabs ready in the background. <a href='navi://tabs' class='btn'>Tab status</a></p>
+            <h3>🛡️ Blocking</h3><label><input type="checkbox" style="width:auto" {'checked' if st['adblock'] else ''} onclick="window.location='navi://set/adblock/'+(this.checked?'on':'off')"> Block ads and trackers</label>
+            <small>({f"{self.main.blocker.index.rules} rules" if self.main.blocker.index else "no filter lists loaded yet"})</small>
+            <p>Allowed sites: <input value="{html.escape(' '.join(st['block_allow']))}" placeholder="example.com news.site.org" onchange="window.location='navi://set/blockallow/'+encodeURIComponent(this.value)"></p>
+            <h3>👤 Profile & Cache</h3><p>New tabs open in <select onchange="window.location='navi://profile/use/'+this.value">{''.join(f"<option {'selected' if n == st['profile'] else ''}>{n}</option>" for n in st['profiles'])}</select>
+            or a new profile: <input style="width:160px" placeholder="work" onchange="window.location='navi://profile/use/'+encodeURIComponent(this.value)"></p>
+            <p>HTTP cache <select style="width:auto" onchange="window.location='navi://set/cachetype/'+this.value">{''.join(f"<option {'selected' if t == st['cache_type'] else ''}>{t}</option>" for t in Profiles.CACHE)}</select>
+            of at most <input type="number" min="0" style="width:100px" value="{st['cache_mb']}" onchange="window.location='navi://set/cachemb/'+this.value"> MB (0 = automatic). <a href='navi://cache' class='btn'>Cache status</a></p>
+            <p>Cache folder: <input value="{html.escape(st['cache_path'])}" placeholder="inside each profile's folder" onchange="window.location='navi://set/cachepath/'+encodeURIComponent(this.value)"></p>
+            <p>Profile folder (from next start): <input value="{html.escape(st['storage_path'])}" placeholder="{os.path.abspath(PROFILE_DIR)}" onchange="window.location='navi://set/storagepath/'+encodeURIComponent(this.value)"></p>
+            <h3>⬇️ Saved Pages</h3><label><input type="checkbox" style="width:auto" {'checked' if st.get('dl_mhtml') else ''} onclick="window.location='navi://set/mhtml/'+(this.checked?'on':'off')"> Save complete pages with images and CSS (MHTML)</label>
+            </div>""")
+
+    def store(self):
+        inv = self.main.data['inventory']
+        def itm(i,n,c): return f"<div class='card'><h3>{n}</h3><a href='navi://buy/{i}' class='btn btn-gold'>Buy ({c})</a></div>" if i not in inv else ""
+        items = itm("cyberpunk","Cyberpunk",100) + itm("sunset","Sunset",100) + itm("matrix","Matrix",125) + itm("christmas","Christmas",150) + itm("halloween","Halloween",150)
+        return self.wrap(f"<h1>🛒 Store ({self.main.data['navits']} N)</h1><div class='widget-grid'>{items}</div>")
+
+    def pw(self):
+        return self.wrap(f"<h1>Sites</h1><a href='navi://pw/new' class='btn'>+ New</a><br><br><div class='widget-grid'>{''.join([f'<div class=card><b>{html.escape(v["title"])}</b><br>{k}<br><a href="local://{k}/" class=btn>Go</a> <a href="navi://pw/edit/{k}" class=btn>Edit</a> <a href="navi://pw/del/{k}" class="btn btn-danger">Del</a></div>' for k,v in self.main.data['sites'].items()])}</div>")
+
+    def cws(self):
+        return self.wrap(f"<h1>Extensions</h1><a href='navi://cws/new' class='btn'>+ New</a><br><br><div class='widget-grid'>{''.join([f'<div class=card><h3>{k}</h3><small>{html.escape(e.get("match") or "all web pages")} · {e.get("run_at", "idle")}{" · isolated" if e.get("isolated") else ""}</small><br><br><a href=navi://cws/toggle/{k} class=btn>Toggle ({e["active"]})</a> <a href=navi://cws/edit/{k} class=btn>Edit</a></div>' for k, e in self.main.data['extensions'].items()])}</div>")
+
+    def dlw(self):
+        return self.wrap(f"<h1>Downloads</h1>{''.join([f'<div class=card><h3>{html.escape(d["title"])}</h3><a href=navi://dlw/view/{d["id"]} class=btn>View</a></div>' for d in self.main.data["downloads"]])}")
+
+    def history(self, url):
+        # Only one page of rows is fetched and rendered, whatever the size of the history
+        q = dict(QUrlQuery(url).queryItems(QUrl.ComponentFormattingOption.FullyDecoded))
+        s = q.get('q', ''); before = (float(q['before']), int(q.get('id', 0))) if q.get('before') else None
+        self.main.store.flush()
+        rows = self.main.store.query_hist(s, before)
+        items = ''.join([f"<div class=card><a href='{html.escape(h['url'], True)}'>{html.escape(h['title'] or h['url'])}</a><br><small>{html.escape(h['url'])} · {h['visits']} visit{'s' if h['visits']!=1 else ''} · {datetime.fromtimestamp(h['time']).strftime('%Y-%m-%d %H:%M')}</small></div>" for h in rows])
+        more = f"<a href='navi://history?q={QUrl.toPercentEncoding(s).data().decode()}&before={rows[-1]['time']!r}&id={rows[-1]['id']}' class=btn>Older →</a>" if len(rows)==HIST_PAGE else ""
+        return self.wrap(f"""<h1>History</h1>
+            <form onsubmit="window.location='navi://history?q='+encodeURIComponent(this.q.value);return false"><input name="q" value="{html.escape(s, True)}" placeholder="Search history"></form><br>
+            {items or "<div class=card>No history found.</div>"}{more}""")
+
+    def tabs(self):
+        m = self.main; c = m.tm.counts(); rss = m.tm.rss()
+        rows = ''.join([f"<div class=card><b>{html.escape(m.tabs.tabText(i))}</b><br><small>{f'{b.page().lifecycleState().name} · {len(b.injected)} extension injections · {b.blocked} blocked ({b.blocked_total} total)' if isinstance(b, BrowserTab) else 'Restored, loads when selected'}</small></div>" for i in range(m.tabs.count()) for b in [m.tabs.widget(i)]])
+        return self.wrap(f"<h1>Tabs</h1><div class='card'>Active: {c['active']} · Frozen: {c['frozen']} · Discarded: {c['discarded']}{f' · Renderers: {rss:.0f} MB' if rss else ''}<br>Warm new tabs: {len(m.pool.tabs)} ready · {m.pool.hits} used · {m.pool.misses} missed</div>{rows}")
+
+    def cache_page(self):
+        m, loads = self.main, [r for r in PERF.loads if 'resources' in r]
+        res, hits = sum(r['resources'] + 1 for r in loads), sum(r.get('cached', 0) for r in loads)
+        saved = sum(max(0, r.get('decoded', 0) - r.get('bytes', 0)) for r in loads)
+        cards = ""
+        for n, p in m.profiles.all.items():
+            tabs = sum(1 for i in range(m.tabs.count()) if isinstance(m.tabs.widget(i), BrowserTab) and m.tabs.widget(i).page().profile() is p)
+            cards += (f"<div class=card><h3>{n}{' (new tabs)' if n == m.data['settings']['profile'] else ''}</h3>"
+                      f"<small>{html.escape(p.cachePath())}</small><br>{p.httpCacheType().name} · {Profiles.disk_mb(p):.1f} MB on disk · "
+                      f"limit {f'{p.httpCacheMaximumSize() / 1048576:.0f} MB' if p.httpCacheMaximumSize() else 'automatic'} · {tabs} tabs<br><br>"
+                      f"<a href='navi://cache/clear/{n}' class='btn btn-danger'>Clear</a></div>")
+        st = m.sites
+        return self.wrap(f"<h1>Cache</h1><div class=card>Last {len(loads)} loads: {hits} of {res} requests served from cache"
+                         f"{f' ({hits / res * 100:.0f}%)' if res else ''} · {saved / 1048576:.1f} MB not downloaded again<br>"
+                         f"Local sites: {len(st.lru)} files, {st.size / 1048576:.1f} of {st.budget / 1048576:.0f} MB in memory · {st.hits} hits, {st.misses} reads</div>{cards}")
+
+    def perf(self):
+        m, loads = self.main, list(PERF.loads)
+        ms = [r['ms'] for r in loads if r['ok']]
+        agg = (f"<div class=card><b>{len(loads)} loads</b> (last {PERF.size} kept) · p50 {pct(ms, .5):.0f} ms · p95 {pct(ms, .95):.0f} ms · "
+               f"{sum(r.get('bytes', 0) for r in loads) / 1048576:.1f} MB transferred · renderers {m.tm.rss():.0f} MB "
+               f"<a href='navi://perf/export' class=btn style='float:right'>Export JSONL</a></div>")
+        tabs = ""
+        for i in range(m.tabs.count()):
+            b = m.tabs.widget(i)
+            if not isinstance(b, BrowserTab): continue
+            pid = b.page().renderProcessPid(); mine = [r['ms'] for r in loads if r['tab'] == b.tid and r['ok']]
+            tabs += f"<tr><td>{html.escape(m.tabs.tabText(i))}</td><td>{pid}</td><td>{rss_mb(pid):.0f} MB</td><td>{len(mine)}</td><td>{mine[-1] if mine else 0:.0f} ms</td><td>{pct(mine, .5):.0f} ms</td></tr>"
+        slow = sorted(((d, n, sz, r['url']) for r in loads for n, d, sz in r.get('slowest', [])), reverse=True)[:10]
+        slow = "".join(f"<tr><td>{d} ms</td><td>{sz / 1024:.0f} KB</td><td>{html.escape(n[:90])}</td></tr>" for d, n, sz, _ in slow)
+        costs = "".join(f"<tr><td>{k}</td><td>{len(v)}</td><td>{pct(v, .5):.2f} ms</td><td>{pct(v, .95):.2f} ms</td><td>{max(v):.2f} ms</td></tr>" for k, v in sorted(PERF.costs.items()))
+        recent = "".join(f"<tr><td>{datetime.fromtimestamp(r['time']).strftime('%H:%M:%S')}</td><td>{r['ms']:.0f} ms</td><td>{r.get('ttfb', '')}</td><td>{r.get('bytes', 0) / 1024:.0f} KB</td><td>{html.escape(r['url'][:80])}</td></tr>" for r in reversed(loads[-20:]))
+        t = lambda h, rows: f"<table style='width:100%;text-align:left'><tr>{''.join(f'<th>{x}</th>' for x in h)}</tr>{rows}</table>"
+        return self.wrap(f"<h1>Performance</h1>{agg}"
+                         f"<div class=card><h3>Tabs</h3>{t(('Tab', 'Renderer', 'RSS', 'Loads', 'Last', 'p50'), tabs)}</div>"
+                         f"<div class=card><h3>Browser</h3>{t(('Call', 'Count', 'p50', 'p95', 'Max'), costs)}</div>"
+                         f"<div class=card><h3>Slowest resources</h3>{t(('Time', 'Size', 'Resource'), slow)}</div>"
+                         f"<div class=card><h3>Recent loads</h3>{t(('At', 'Load', 'TTFB ms', 'Bytes', 'Url'), recent)}</div>")
+
+# --- Internal Schemes ---
+def register_schemes():
+    # Custom schemes have to be registered before the QApplication is created
+    for name in (b"navi", b"local"):
+        sc = QWebEngineUrlScheme(name); sc.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+        sc.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.CorsEnabled)
+        QWebEngineUrlScheme.registerScheme(sc)
+
+class NaviSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, router, parent=None):
+        super().__init__(parent)
+        self.router = router
+
+    def requestStarted(self, job):
+        try: r = self.router.route(job.requestUrl())
+        except Exception as e: print(f"navi: {e}"); job.fail(QWebEngineUrlRequestJob.Error.RequestFailed); return
+        if not r: job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound); return
+        buf = QBuffer(job); buf.setData(r[1]); buf.open(QIODevice.OpenModeFlag.ReadOnly)
+        job.reply(r[0], buf)
+
 # --- Editors ---
 class CodeEditor(QWidget):
     def __init__(self, main, mode="site", key=None):
@@ -232,17 +1159,33 @@ class CodeEditor(QWidget):
         
         if mode=="site": 
             self.ti = QLineEdit(); self.ti.setPlaceholderText("Title"); l.addWidget(QLabel("Title")); l.addWidget(self.ti)
+        else:
+            self.match = QLineEdit(); self.match.setPlaceholderText("e.g. https://*.example.com/*  (blank = every http/https page)"); l.addWidget(QLabel("Match")); l.addWidget(self.match)
+            self.run_at = QComboBox(); self.run_at.addItems(["idle", "ready", "start"]); l.addWidget(QLabel("Run at")); l.addWidget(self.run_at)
+            self.iso = QCheckBox("Run isolated from the page's scripts"); l.addWidget(self.iso)
         
         self.code = QTextEdit(); self.code.setPlaceholderText("HTML Code" if mode=="site" else "JavaScript Code"); l.addWidget(QLabel("Code")); l.addWidget(self.code)
         
+        if mode=="site":
+            f = QPushButton("Open site folder (css, js, images next to index.html)"); f.clicked.connect(self.folder); l.addWidget(f)
         btn = QPushButton("Save"); btn.setStyleSheet("background:#198754;color:white;padding:10px;"); btn.clicked.connect(self.save); l.addWidget(btn)
         self.setLayout(l)
         
         if key:
             d = main.data['sites' if mode=="site" else 'extensions'].get(key)
             if d:
-                self.code.setText(d['html_content'] if mode=="site" else d['code'])
+                self.code.setText(main.sites.index(key) if mode=="site" else d['code'])
                 if mode=="site": self.ti.setText(d['title'])
+                else: self.match.setText(d.get('match', '')); self.run_at.setCurrentText(d.get('run_at', 'idle')); self.iso.setChecked(d.get('isolated', False))
+
+    def domain(self):
+        n, s = self.name.text().strip().lower(), self.main.data['settings']['suffix']
+        return n if n.endswith(s) else f"{n}{s}"
+
+    def folder(self):
+        if not self.name.text().strip(): return
+        d = self.main.sites.dir(self.domain()); os.makedirs(d, exist_ok=True)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(d)))
 
     def save(self):
         n = self.name.text().strip()
@@ -250,22 +1193,386 @@ class CodeEditor(QWidget):
         if not n: return
         
         if self.mode == "site":
-            s = self.main.data['settings']['suffix']
-            f = f"{n.lower()}{s}" if not n.endswith(s) else n.lower()
-            self.main.data['sites'][f] = {'domain': f, 'title': self.ti.text(), 'html_content': c}
+            f = self.domain()
+            self.main.sites.save_index(f, c)
+            self.main.data['sites'][f] = {'domain': f, 'title': self.ti.text()}
+            self.main.omni.add(f"local://{f}/", self.ti.text(), "site", frecency(1, time.time()))
             self.main.add_tab(QUrl(f"local://{f}/"))
         else:
-            self.main.data['extensions'][n] = {'code': c, 'active': True}
+            e = self.main.data['extensions'][n] = {'code': c, 'active': True, 'match': self.match.text().strip(), 'run_at': self.run_at.currentText(), 'isolated': self.iso.isChecked()}
+            self.main.ext.install(n, e)
         
-        self.main.save_data(); self.close()
+        self.main.save_data('sites' if self.mode == "site" else 'extensions'); self.close()
 
 class SourceViewer(QDialog):
     def __init__(self, t, p=None):
         super().__init__(p); self.resize(800,600); e=QPlainTextEdit(t); e.setReadOnly(True); l=QVBoxLayout(); l.addWidget(e); self.setLayout(l)
 
+# --- Extensions ---
+class ExtensionRegistry:
+    """Installs extensions once into each profile's script collection instead of running them from Python on every load.
+
+    Each extension may carry 'match' (space separated @match patterns), 'run_at' (start/ready/idle) and 'isolated'
+    (run in its own JS world). A ==UserScript== header in the code itself takes precedence, as QtWebEngine parses it.
+    """
+    PREFIX = "navi-ext:"
+    RUN_AT = {"start": QWebEngineScript.InjectionPoint.DocumentCreation, "ready": QWebEngineScript.InjectionPoint.DocumentReady, "idle": QWebEngineScript.InjectionPoint.Deferred}
+    # Counts injections per page: every extension fires a DOM event, which is visible across worlds
+    COUNTER = "window.__naviExt = []; document.addEventListener('navi-ext', e => window.__naviExt.push(e.detail));"
+
+    def __init__(self):
+        self.colls = []; self.names = {} # installed extension -> its script
+
+    def add_profile(self, profile):
+        s = profile.scripts(); self.colls.append(s)
+        c = QWebEngineScript(); c.setName("navi-ext-counter"); c.setSourceCode(self.COUNTER)
+        c.setInjectionPoint(QWebEngineScript.InjectionPoint.DocumentCreation); c.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld.value)
+        s.insert(c)
+        for sc in self.names.values(): s.insert(sc)
+
+    def sync(self, exts):
+        for n in self.names.keys() - set(exts): self.uninstall(n)
+        for n, e in exts.items(): self.install(n, e)
+
+    def uninstall(self, n):
+        for s in self.colls:
+            for sc in s.find(self.PREFIX + n): s.remove(sc)
+        self.names.pop(n, None)
+
+    @timed("ext install")
+    def install(self, n, e):
+        self.uninstall(n)
+        if not e['active']: return
+        code, header = e['code'], "==UserScript==" in e['code']
+        if not header:
+            code = "// ==UserScript==\n" + "".join(f"// @match {m}\n" for m in (e.get('match') or "*://*/*").split()) + "// ==/UserScript==\n" + code
+        sc = QWebEngineScript(); sc.setName(self.PREFIX + n)
+        if not header: sc.setInjectionPoint(self.RUN_AT.get(e.get('run_at'), self.RUN_AT["idle"]))
+        sc.setSourceCode(f"{code}\n;document.dispatchEvent(new CustomEvent('navi-ext', {{detail: {json.dumps(n)}}}));")
+        # Isolated extensions get a world of their own (ids 0-2 are Qt's main/application/user worlds)
+        sc.setWorldId(3 + zlib.crc32(n.encode()) % 250 if e.get('isolated') else QWebEngineScript.ScriptWorldId.MainWorld.value)
+        for s in self.colls: s.insert(sc)
+        self.names[n] = sc
+
+# --- Omnibox ---
+def frecency(visits, last):
+    # log(visits * 2^((last - now) / half_life)) + now-term: the now-term is the same for every entry,
+    # so ranks compare correctly without ever being re-aged and only change when a url is visited
+    return math.log(max(visits, 1)) + math.log(2) / FRECENCY_HALF_LIFE * last
+
+def revisit(rank, now):
+    """Rank after one more visit at `now`: decayed score + 1."""
+    lam = math.log(2) / FRECENCY_HALF_LIFE
+    return lam * now if rank is None else math.log(math.exp(rank - lam * now) + 1) + lam * now
+
+def omni_key(text): return re.sub(r"^[a-z][a-z0-9+.-]*://(www\.)?", "", text.strip().lower())
+
+class PrefixIndex:
+    """Burst trie over string keys. Every node keeps the K best-ranked ids below it, so a prefix
+    lookup is one walk down the trie; leaves are flat buckets that split once they grow past B."""
+    K, B, MAX_DEPTH = 32, 64, 48
+
+    def __init__(self):
+        self.root = [None, [], []] # node = [children by char | None, top ids, bucket of (key, id) | None]
+        self.rank, self.keys = {}, {}
+
+    def better(self, top, i):
+        r = self.rank
+        if i not in top:
+            if len(top) < self.K: top.append(i)
+            elif r[i] > r[top[-1]]: top[-1] = i
+            else: return
+        top.sort(key=r.__getitem__, reverse=True)
+
+    def add(self, i, rank, keys=()):
+        """Insert or re-rank `i`; ranks only go up, so re-walking its keys keeps every top list valid."""
+        old = self.rank.get(i); self.rank[i] = rank if old is None else max(rank, old)
+        ks = self.keys.get(i, ())
+        for k in ks: self.walk(k, i, False)
+        new = tuple(k for k in set(keys).difference(ks) if k)
+        for k in new: self.walk(k, i, True)
+        if new: self.keys[i] = ks + new
+
+    def walk(self, k, i, new):
+        node, d = self.root, 0
+        while True:
+            self.better(node[1], i)
+            if node[2] is not None:
+                if new:
+                    node[2].append((k, i))
+                    if len(node[2]) > self.B and d < self.MAX_DEPTH: self.burst(node, d)
+                return
+            if d == len(k): return
+            node = node[0].setdefault(k[d], [None, [], []]); d += 1
+
+    def burst(self, node, d):
+        kids = {}
+        for e in node[2]:
+            if len(e[0]) > d: kids.setdefault(e[0][d], []).append(e)
+        node[0] = {c: self.make(es) for c, es in kids.items()}; node[2] = None
+
+    def make(self, es): return [None, heapq.nlargest(self.K, {i for _, i in es}, key=self.rank.__getitem__), es]
+
+    def build(self, entries, pause=None):
+        """Bulk load from (key, id) pairs; ranks must already be in self.rank. `pause` is called between subtrees."""
+        self.root = self.grow(entries, 0, pause)
+
+    def grow(self, es, d, pause=None):
+        if len(es) <= self.B or d >= self.MAX_DEPTH: return self.make(es)
+        if pause and d < 3: pause()
+        kids = {}
+        for e in es:
+            if len(e[0]) > d: kids.setdefault(e[0][d], []).append(e)
+        node = [{c: self.grow(x, d + 1, pause) for c, x in kids.items()}, None, None]
+        cand = {i for c in node[0].values() for i in c[1]} | {i for k, i in es if len(k) == d}
+        node[1] = heapq.nlargest(self.K, cand, key=self.rank.__getitem__)
+        return node
+
+    def query(self, p, n=None):
+        """Best-ranked ids with a key starting with `p`."""
+        node, d = self.root, 0
+        while d < len(p):
+            if node[2] is not None:
+                return heapq.nlargest(n or self.K, {i for k, i in node[2] if k.startswith(p)}, key=self.rank.__getitem__)
+            node = node[0].get(p[d])
+            if node is None: return []
+            d += 1
+        return node[1][:n or self.K]
+
+class Omnibox(QObject):
+    """Url bar suggestions: history, sites, saved pages and navi:// pages in one PrefixIndex keyed by
+    url (scheme and www. stripped) and title words. Full rebuilds run on a thread; edits made
+    meanwhile are queued and replayed on the fresh index."""
+    built = pyqtSignal(int, object) # (generation, fresh state or None if the build failed)
+    PAGES = {"navi://settings": "Settings", "navi://history": "History", "navi://tabs": "Tabs", "navi://pw": "Sites", "navi://cache": "Cache",
+             "navi://cws": "Extensions", "navi://dlw": "Downloads", "navi://store": "Store", "navi://perf": "Performance"}
+    ICONS = {"history": "🕘", "site": "🌐", "saved": "💾", "navi": "⚙️"}
+    TOP_KEEP = 32 # best-ranked history urls tracked for top_sites
+    CHUNK = 2000 # rows indexed between pauses during a background rebuild
+
+    def __init__(self):
+        super().__init__()
+        self.idx, self.meta = PrefixIndex(), {}
+        self.top = {} # url -> rank of the TOP_KEEP best history urls
+        self.pending, self.gen = None, 0
+        self.built.connect(self.swap)
+
+    @staticmethod
+    def keys(url, title): return [omni_key(url)] + [w for w in re.split(r"\W+", (title or "").lower()) if len(w) > 1][:8]
+
+    def add(self, url, title, kind, rank=None):
+        if self.pending is not None: self.pending.append((url, title, kind, rank)); return
+        old = self.meta.get(url)
+        self.meta[url] = (kind, title or (old[1] if old else ""))
+        self.idx.add(url, revisit(self.idx.rank.get(url), time.time()) if rank is None else rank, self.keys(url, title))
+        if kind == "history": self.rank_top(url, self.idx.rank[url])
+
+    def rank_top(self, url, rank):
+        if url in self.top or len(self.top) < self.TOP_KEEP: self.top[url] = rank; return
+        low = min(self.top, key=self.top.get)
+        if rank > self.top[low]: del self.top[low]; self.top[url] = rank
+
+    def top_sites(self, n):
+        """[url, title] of the best-ranked history urls, one per host."""
+        out, hosts = [], set()
+        for url in sorted(self.top, key=self.top.get, reverse=True):
+            h = QUrl(url).host().removeprefix("www.")
+            if h and h not in hosts: hosts.add(h); out.append([url, self.meta[url][1]])
+            if len(out) == n: break
+        return out
+
+    def visit(self, url, title): self.add(url, title, "history")
+
+    @staticmethod
+    def pause(): time.sleep(0) # drops the GIL, so the GUI thread gets a turn mid-build
+
+    def load(self, rows, pause=None):
+        """A fresh (index, meta) from (url, title, kind, rank) rows; `pause` is called every CHUNK rows."""
+        idx, meta, es = PrefixIndex(), {}, []
+        for n, (url, title, kind, rank) in enumerate(rows):
+            if pause and not n % self.CHUNK: pause()
+            if url in meta: continue
+            meta[url] = (kind, title or ""); idx.rank[url] = rank
+            ks = idx.keys[url] = tuple(set(filter(None, self.keys(url, title))))
+            es += [(k, url) for k in ks]
+        idx.build(es, pause)
+        return idx, meta
+
+    def rebuild(self, rows):
+        """Rebuild from rows() in the background; the old index keeps answering until the new one is ready."""
+        self.gen += 1; gen = self.gen
+        if self.pending is None: self.pending = []
+        def job():
+            fresh = None
+            try:
+                rs = rows()
+                fresh = self.load(rs, self.pause) + (dict(heapq.nlargest(self.TOP_KEEP, ((u, r) for u, _, kind, r in rs if kind == "history"), key=lambda e: e[1])),)
+            except Exception as e: print(f"omnibox: {e}")
+            finally:
+                # Always hand back to swap, which ends the pending state; a failed build keeps the old index
+                self.built.emit(gen, fresh)
+        threading.Thread(target=job, name="navi-omnibox", daemon=True).start()
+
+    def swap(self, gen, fresh):
+        if gen != self.gen or self.pending is None: return # superseded; the newer build replays the queued edits
+        if fresh: self.idx, self.meta, self.top = fresh
+        ops, self.pending = self.pending, None
+        for op in ops: self.add(*op)
+
+    def suggest(self, text, n=OMNI_SHOWN):
+        """(url, kind, title) for the best matches; extra words must appear in the url or title."""
+        words = text.lower().split()
+        if not words: return []
+        head = omni_key(words[0]); out = []
+        for url in self.idx.query(head, None if len(words) == 1 else PrefixIndex.K):
+            kind, title = self.meta[url]
+            if all(w in url.lower() or w in title.lower() for w in words[1:]): out.append((url, kind, title))
+            if len(out) == n: break
+        return out
+
+# --- Profiles ---
+class Profiles:
+    """Named persistent QWebEngineProfiles, created on first use. Each has its own cookies, storage and HTTP cache;
+    all share the internal schemes and extensions."""
+    CACHE = {"disk": QWebEngineProfile.HttpCacheType.DiskHttpCache, "memory": QWebEngineProfile.HttpCacheType.MemoryHttpCache,
+             "none": QWebEngineProfile.HttpCacheType.NoCache}
+
+    def __init__(self, main):
+        self.main = main
+        self.all = {}
+
+    @staticmethod
+    def clean(name): return re.sub(r"[^a-z0-9_-]", "", name.lower())[:32] or "default"
+
+    def get(self, name=None):
+        name = self.clean(name or self.main.data['settings']['profile'])
+        p = self.all.get(name)
+        if p is None:
+            st = self.main.data['settings']
+            p = self.all[name] = QWebEngineProfile(name, self.main)
+            # Storage location is fixed for the life of a profile, so a changed storage path applies from the next start
+            p.setPersistentStoragePath(os.path.abspath(os.path.join(st['storage_path'] or PROFILE_DIR, name)))
+            p.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.AllowPersistentCookies)
+            self.configure(p)
+            for s in (b"navi", b"local"): p.installUrlSchemeHandler(s, self.main.schemes)
+            self.main.ext.add_profile(p)
+        return p
+
+    def configure(self, p):
+        st = self.main.data['settings']
+        p.setCachePath(os.path.abspath(os.path.join(st['cache_path'], p.storageName())) if st['cache_path'] else os.path.join(p.persistentStoragePath(), "cache"))
+        p.setHttpCacheType(self.CACHE.get(st['cache_type'], self.CACHE["disk"]))
+        p.setHttpCacheMaximumSize(st['cache_mb'] * 1048576) # 0 lets the engine pick
+
+    def reconfigure(self):
+        for p in self.all.values(): self.configure(p)
+
+    @staticmethod
+    def disk_mb(p):
+        n = 0
+        for d, _, fs in os.walk(p.cachePath()):
+            for f in fs:
+                try: n += os.path.getsize(os.path.join(d, f))
+                except OSError: pass
+        return n / 1048576
+
+# --- Tab Lifecycle ---
+def rss_mb(pid):
+    # Resident memory of a renderer process; 0 where /proc is unavailable (the tab-count budget still applies)
+    try:
+        with open(f"/proc/{pid}/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, IndexError): return 0
+
+class TabManager:
+    """Freezes idle background tabs and discards the least recently used ones once over the tab/memory budget."""
+    Active, Frozen, Discarded = QWebEnginePage.LifecycleState.Active, QWebEnginePage.LifecycleState.Frozen, QWebEnginePage.LifecycleState.Discarded
+
+    def __init__(self, main):
+        self.main = main
+        self.seen = {} # tab -> last activation (monotonic)
+        self.t = QTimer(main); self.t.timeout.connect(self.sweep); self.t.start(TAB_SWEEP_MS)
+
+    def track(self, b): self.seen[b] = time.monotonic()
+    def forget(self, b): self.seen.pop(b, None)
+
+    def activate(self, b):
+        # Discarded pages reload themselves (with their history) when made active again
+        self.seen[b] = time.monotonic()
+        if b.page().lifecycleState() != self.Active: b.page().setLifecycleState(self.Active)
+        if not b.yt_t.isActive(): b.yt_t.start()
+
+    def suspend(self, b, state):
+        b.yt_t.stop(); b.page().setLifecycleState(state)
+
+    def rss(self):
+        return sum(rss_mb(p) for p in {b.page().renderProcessPid() for b in self.seen if b.page().lifecycleState() != self.Discarded} if p)
+
+    def sweep(self):
+        st = self.main.data['settings']; cur = self.main.tabs.currentWidget(); now = time.monotonic()
+        bg = sorted((b for b in self.seen if b is not cur and not b.page().recentlyAudible()), key=self.seen.get) # LRU first
+        for b in bg:
+            if b.page().lifecycleState() == self.Active and now - self.seen[b] > st['freeze_after']: self.suspend(b, self.Frozen)
+        live = [b for b in bg if b.page().lifecycleState() != self.Discarded]
+        n = max(0, len(live) + 1 - st['tab_budget']) # +1 for the current tab
+        for b in live[:n]: self.suspend(b, self.Discarded)
+        live = live[n:]
+        # Renderer memory is only released asynchronously, so discard one tab per sweep until under budget
+        if live and st['mem_budget'] and self.rss() > st['mem_budget']: self.suspend(live[0], self.Discarded)
+
+    def counts(self):
+        c = {'active': 0, 'frozen': 0, 'discarded': 0}
+        for b in self.seen: c[b.page().lifecycleState().name.lower()] += 1
+        return c
+
+# --- New Tab Pool ---
+class TabPool:
+    """Hidden tabs with the new tab page already loaded, handed out by add_tab and refilled while the browser is idle."""
+    def __init__(self, main):
+        self.main = main
+        self.tabs = []
+        self.hits = self.misses = 0
+        self.t = QTimer(main); self.t.setSingleShot(True); self.t.timeout.connect(self.fill)
+        self.schedule()
+
+    def size(self): return self.main.data['settings']['tab_pool']
+
+    def schedule(self):
+        if len(self.tabs) < self.size() and not self.t.isActive(): self.t.start(POOL_REFILL_MS)
+
+    def fill(self):
+        # One tab per timeout, so warming never holds up input for long
+        if len(self.tabs) >= self.size(): return
+        b = BrowserTab(self.main, self.main.profiles.get()); b.setUrl(QUrl("local://navi/")); b.warm = self.main.router.key('home')
+        self.tabs.append(b); self.schedule()
+
+    def take(self, profile):
+        for b in [b for b in self.tabs if b.page().profile() is not profile]: self.tabs.remove(b); b.deleteLater() # warmed for another profile
+        while len(self.tabs) > self.size(): self.tabs.pop().deleteLater()
+        if not self.tabs: self.misses += 1; self.schedule(); return None
+        b = self.tabs.pop(0); self.hits += 1
+        if b.warm != self.main.router.key('home'): b.reload() # navits/background changed since it was warmed; a cache hit anyway
+        self.schedule(); return b
+
+    def close(self):
+        # Pooled views have no parent, so nothing orders their teardown before the window's profiles; delete them (and
+        # their pages) now, or a profile can be released while one of its pages still exists
+        self.t.stop()
+        for b in self.tabs: sip.delete(b)
+        self.tabs = []
+
+# --- Session ---
+class LazyTab(QWidget):
+    """Stand-in for a restored tab: holds its place and title in the tab bar and is swapped for a BrowserTab
+    (NaviBrowser.wake) when first selected. `t` is its session entry: url, title, profile and base64 history."""
+    def __init__(self, t):
+        super().__init__()
+        self.t = t
+
 # --- Browser Tab ---
 class BrowserTab(QWebEngineView):
-    def __init__(self, main):
+    ids = itertools.count(1)
+
+    def __init__(self, main, profile):
         super().__init__()
         self.main = main
         self.yt_t = QTimer(self); self.yt_t.timeout.connect(self.chk_yt); self.yt_t.start(60000)
@@ -273,7 +1580,14 @@ class BrowserTab(QWebEngineView):
         self.settings().setAttribute(QWebEngineSettings.WebAttribute.PluginsEnabled, True)
         self.settings().setAttribute(QWebEngineSettings.WebAttribute.JavascriptEnabled, True)
         self.settings().setAttribute(QWebEngineSettings.WebAttribute.LocalStorageEnabled, True)
-        self.setPage(NaviWebPage(self)) 
+        self.injected = [] # extensions that ran on the current page
+        self.is_loaded = False
+        self.tid = next(BrowserTab.ids); self.t_load = self.t_first = None # for navi://perf
+        self.setPage(NaviWebPage(profile, self))
+        self.blocked = self.blocked_total = 0 # requests blocked on the current page / ever in this tab
+        self.page().setUrlRequestInterceptor(TabBlocker(self))
+        self.page().loadStarted.connect(self.started)
+        self.page().loadProgress.connect(self.progress)
         self.page().loadFinished.connect(self.loaded)
 
     def chk_yt(self):
@@ -281,101 +1595,232 @@ class BrowserTab(QWebEngineView):
             self.yt_m += 1
             if self.yt_m == 15: self.main.add_navits(1, "YouTube"); self.yt_m = 0
 
+    def started(self): self.is_loaded = False; self.t_load = time.perf_counter(); self.t_first = None; self.blocked = 0
+    def progress(self, p):
+        if p and self.t_first is None: self.t_first = time.perf_counter()
+
     def loaded(self, ok):
+        self.is_loaded = True; PERF.page_loaded(self, ok)
         if not ok: return
-        for e in self.main.data['extensions'].values():
-            if e['active']: self.page().runJavaScript(e['code'])
+        if self.main.ext.names: self.page().runJavaScript("window.__naviExt || []", QWebEngineScript.ScriptWorldId.ApplicationWorld.value, lambda v: setattr(self, 'injected', v or []))
         
         u = self.url().toString()
         if "google.com" in u or "duckduckgo" in u: self.main.sch_rwd(1)
         elif "ecosia" in u: self.main.sch_rwd(2)
         
         if not u.startswith("local://") and not u.startswith("navi://") and not u.startswith("app://"):
-            self.main.add_hist(u, self.title())
+            self.main.add_hist(u, self.title()); self.main.thumb_later(self)
 
-    def createWindow(self, _type): return self.main.add_tab()
+    def createWindow(self, _type): return self.main.add_tab(profile=self.page().profile(), popup=True)
 
 # --- Custom Web Page with View Fix ---
 class NaviWebPage(QWebEnginePage):
-    def __init__(self, view):
-        super().__init__(view)
+    def __init__(self, profile, view):
+        super().__init__(profile, view)
         self.view_ref = view # Explicitly store view reference to prevent AttributeError
+        self.popup = False # opened by a page (createWindow): no actions until the user navigates it
 
     def certificateError(self, error): return True
     
     def acceptNavigationRequest(self, url, _type, isMainFrame):
-        if url.scheme() in ["navi", "app"]:
-            if self.view_ref and hasattr(self.view_ref, 'main'):
+        # navi:// pages load normally through the scheme handler; only actions are intercepted here
+        if url.scheme() == "app" or (url.scheme() == "navi" and navi_cmd(url.toString()).startswith(NAVI_ACTIONS)):
+            # Actions are only taken from the URL bar or from internal pages, never from websites
+            cur = self.url()
+            trusted = _type == QWebEnginePage.NavigationType.NavigationTypeTyped or (not self.popup and cur.host().lower() in TRUSTED_HOSTS.get(cur.scheme(), ()))
+            if trusted and self.view_ref and hasattr(self.view_ref, 'main'):
                 self.view_ref.main.handle_cmd(url.toString(), self.view_ref)
             return False
+        if _type == QWebEnginePage.NavigationType.NavigationTypeTyped and isMainFrame: self.popup = False # url bar or the browser itself
         return super().acceptNavigationRequest(url, _type, isMainFrame)
 
 # --- Main Window ---
 class NaviBrowser(QMainWindow):
-    def __init__(self):
+    def __init__(self, urls=()):
         super().__init__()
         self.setWindowTitle("Navi Browser Ultimate v7")
         self.resize(1300, 900)
         # Default Data Structure
         self.data = {
-            'sites': {}, 'extensions': {}, 'history': [], 'downloads': [],
-            'settings': {'theme': 'dark', 'engine': 'Google', 'suffix': '.pw-navi', 'wholesome': True, 'mode': 'modern', 'bg_url': ''},
-            'navits': 0, 'inventory': [], 'last_active': time.time(), 'last_reward': 0
+            'sites': {}, 'extensions': {}, 'downloads': [],
+            'settings': {'theme': 'dark', 'engine': 'Google', 'suffix': '.pw-navi', 'wholesome': True, 'mode': 'modern', 'bg_url': '', 'dl_mhtml': False, 'hist_days': 0, 'tab_budget': 15, 'mem_budget': 0, 'freeze_after': 120, 'tab_pool': 1, 'adblock': True, 'block_allow': [], 'profile': 'default', 'profiles': ['default'], 'cache_type': 'disk', 'cache_mb': 0, 'cache_path': '', 'storage_path': ''},
+            'navits': 0, 'inventory': [], 'last_active': time.time(), 'last_reward': 0, 'top_sites': [], 'session': {}
         }
-        self.load_data()
-        self.check_dead()
+        self.store = NaviStore()
+        self.archive = PageArchive()
+        self.last_hist = None
+        self.load_data(EARLY_KEYS); TRACE.mark("data")
+        self.assets = AssetCache(); self.assets.ready.connect(self.assets_ready)
+        self.sites = SiteBundles()
+        scr = QApplication.primaryScreen()
+        if scr: self.assets.screen = (int(scr.size().width() * scr.devicePixelRatio()), int(scr.size().height() * scr.devicePixelRatio()))
+        self.router = InternalRouter(self); self.schemes = NaviSchemeHandler(self.router, self)
+        self.ext = ExtensionRegistry()
+        self.profiles = Profiles(self)
+        self.blocker = ContentBlocker(); self.blocker.ready.connect(lambda: self.router.touch('blocker'))
         self.setup_ui()
-        self.apply_theme()
-        self.add_tab(QUrl("local://navi/"))
+        self.tm = TabManager(self)
+        self.pool = TabPool(self)
+        self.omni = Omnibox(); self.omni.built.connect(self.refresh_top)
+        self.theme = None; self.apply_theme()
+        r = self.restore()
+        b = self.open_urls(urls) or r or self.add_tab(QUrl("local://navi/")); TRACE.mark("ui")
+        self.session_t = QTimer(self); self.session_t.timeout.connect(self.save_session); self.session_t.start(SESSION_SAVE_MS)
+        b.loadFinished.connect(lambda ok: self.trace_paint(b) if TRACE.path and "first paint" in TRACE.waiting else None)
+        QTimer.singleShot(0, self.deferred_init) # first thing the event loop does once the window is up
+
+    def deferred_init(self):
+        """Startup work the first window does not need to wait for."""
+        self.load_data(); self.router.touch(*KV_KEYS, 'downloads')
+        if self.sites.migrate(self.data['sites']): self.save_data('sites')
+        self.ext.sync(self.data['extensions'])
+        self.blocker.allow = set(self.data['settings']['block_allow']); self.blocker.start()
+        self.check_dead()
+        self.expire_hist(rebuild=False); self.build_omni()
+        self.expire_t = QTimer(self); self.expire_t.timeout.connect(self.expire_hist); self.expire_t.start(HIST_EXPIRE_MS)
+        TRACE.mark("deferred init")
+
+    def expire_hist(self, rebuild=True):
+        """Apply the hist_days setting; runs on a timer too, so a long session keeps to it."""
+        days = self.data['settings']['hist_days']
+        if days:
+            self.store.expire_hist(days)
+            if rebuild: self.build_omni()
+
+    def listen(self):
+        """Take launches passed on by forward_launch. Only called once nothing answered on INSTANCE_NAME, so an existing socket is left over from a crash."""
+        self.ipc = QLocalServer(self); self.ipc.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        QLocalServer.removeServer(INSTANCE_NAME)
+        if self.ipc.listen(INSTANCE_NAME): self.ipc.newConnection.connect(self.ipc_accept)
+    def ipc_accept(self):
+        while self.ipc.hasPendingConnections():
+            c = self.ipc.nextPendingConnection(); c.disconnected.connect(c.deleteLater)
+            c.readyRead.connect(lambda c=c: self.ipc_read(c)); self.ipc_read(c)
+    def ipc_read(self, c):
+        if not c.canReadLine(): return
+        try: urls = json.loads(bytes(c.readLine()))
+        except ValueError: return
+        self.open_urls(urls)
+        if self.isMinimized(): self.showNormal()
+        self.raise_(); self.activateWindow()
+
+    def trace_paint(self, b):
+        def poll(): b.page().runJavaScript("window.__painted", lambda v: TRACE.mark("first paint") if v else QTimer.singleShot(5, poll))
+        TRACE.mark("first load"); b.page().runJavaScript(PAINT_JS); poll()
 
     def setup_ui(self):
-        tb = QToolBar(); tb.setMovable(False); self.addToolBar(tb)
+        self.tb = tb = QToolBar(); tb.setMovable(False); self.addToolBar(tb)
         for t, f in [("←", self.back), ("→", self.fwd), ("⟳", self.reload), ("🏠", self.home)]:
             b = QPushButton(t); b.setFixedSize(38,38); b.clicked.connect(f); tb.addWidget(b)
         
         self.url = QLineEdit(); self.url.setPlaceholderText("Search..."); self.url.returnPressed.connect(self.nav)
+        self.comp = QCompleter(self); self.comp.setModel(QStandardItemModel(self.comp))
+        self.comp.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion); self.comp.setCompletionRole(Qt.ItemDataRole.UserRole)
+        self.comp.activated[str].connect(self.omni_go)
+        self.url.setCompleter(self.comp); self.url.textEdited.connect(self.suggest)
         tb.addWidget(self.url)
         
         for t, f in [("⬇️", self.dl_pg), ("< >", self.src), ("+", self.add_tab_safe)]:
             b = QPushButton(t); b.setFixedSize(38,38); b.clicked.connect(f); tb.addWidget(b)
 
         self.tabs = QTabWidget(); self.tabs.setDocumentMode(True); self.tabs.setTabsClosable(True)
-        self.tabs.tabCloseRequested.connect(lambda i: self.tabs.removeTab(i) if self.tabs.count()>1 else None)
-        self.tabs.currentChanged.connect(self.upd_url)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        self.tabs.currentChanged.connect(self.tab_changed)
         self.setCentralWidget(self.tabs)
 
     def add_tab_safe(self): self.add_tab()
-    def add_tab(self, u=None, l="New Tab"):
-        if not u: u = QUrl("local://navi/")
-        b = BrowserTab(self); b.setUrl(u)
+    def add_tab(self, u=None, l="New Tab", profile=None, at=-1, history=None, popup=False):
+        profile = profile or self.profiles.get()
+        b = None if history or popup else self.pool.take(profile) # pooled tabs sit on the trusted new tab page
+        if not b:
+            b = BrowserTab(self, profile)
+            if history: QDataStream(history, QIODevice.OpenModeFlag.ReadOnly) >> b.history() # also loads its current entry
+            if popup: b.page().popup = True # left blank; QtWebEngine loads what the opener asked for into it
+            elif not history or not b.history().count(): b.setUrl(u or QUrl("local://navi/"))
+        elif u: b.setUrl(u)
         b.urlChanged.connect(lambda q, b=b: self.upd_url_for(q, b))
         b.titleChanged.connect(lambda t, b=b: self.upd_ti(t, b))
-        i = self.tabs.addTab(b, l); self.tabs.setCurrentIndex(i); return b
+        self.tm.track(b)
+        i = self.tabs.insertTab(at, b, l); self.tabs.setTabToolTip(i, f"Profile: {profile.storageName()}"); self.tabs.setCurrentIndex(i); return b
+    def tab_changed(self, i):
+        b = self.tabs.widget(i)
+        if isinstance(b, LazyTab): self.wake(i); return # wake selects the real tab, which lands back here
+        if b: self.upd_url(i); self.tm.activate(b)
+
+    def restore(self):
+        """Reopens the saved tabs as LazyTabs and wakes only the active one, which is returned (None without a session)."""
+        s = self.data['session']; ts = s.get('tabs')
+        if not ts: return None
+        self.tabs.blockSignals(True) # adding the first tab would select, and so load, it
+        for t in ts: i = self.tabs.addTab(LazyTab(t), t['title'][:15] or "New Tab"); self.tabs.setTabToolTip(i, f"Profile: {t['profile']}")
+        a = min(s.get('active', 0), len(ts) - 1); self.tabs.setCurrentIndex(a)
+        self.tabs.blockSignals(False)
+        self.wake(a); return self.tabs.currentWidget()
+
+    def wake(self, i):
+        z = self.tabs.widget(i); t = z.t
+        h = QByteArray.fromBase64(t['history'].encode()) if t.get('history') else None
+        self.add_tab(QUrl(t['url']), t['title'][:15] or "New Tab", self.profiles.get(t['profile']), i, h)
+        self.tabs.removeTab(self.tabs.indexOf(z)); z.deleteLater()
+
+    def save_session(self):
+        tabs = []
+        for i in range(self.tabs.count()):
+            b = self.tabs.widget(i)
+            if isinstance(b, LazyTab): tabs.append(b.t); continue
+            h = QByteArray(); QDataStream(h, QIODevice.OpenModeFlag.WriteOnly) << b.history()
+            tabs.append({'url': b.url().toString(), 'title': b.title() or self.tabs.tabText(i), 'profile': b.page().profile().storageName(), 'history': h.toBase64().data().decode()})
+        s = {'tabs': tabs, 'active': self.tabs.currentIndex()}
+        if s != self.data['session']: self.data['session'] = s; self.save_data('session')
+
+    def close_tab(self, i):
+        if self.tabs.count()<=1: return
+        b = self.tabs.widget(i); self.tabs.removeTab(i); self.tm.forget(b); b.deleteLater()
+
+    def resolve(self, t):
+        """QUrl for url bar or command line text: a navi page, a local site, a url or a search."""
+        if t.lower().startswith(("navi://", "file://")): return QUrl(t)
+        if t.endswith(self.data['settings']['suffix']): return QUrl(f"local://{t.lower()}/")
+        u = QUrl(t) if "." in t else QUrl(get_search_url(self.data['settings']['engine'], t))
+        if "://" not in t and "." in t: u = QUrl("https://"+t)
+        return u
+    def open_urls(self, urls):
+        """One tab per url, for the command line and forwarded launches. Returns the last tab opened."""
+        b = None
+        for t in filter(None, map(str.strip, urls)): b = self.add_tab(self.resolve(t))
+        return b
 
     def nav(self):
         t = self.url.text().strip(); b = self.tabs.currentWidget()
         if not b: return
-        if t.lower().startswith("navi://"): self.handle_cmd(t, b)
-        elif t.endswith(self.data['settings']['suffix']):
-            d = self.data['sites'].get(t.lower())
-            if d: b.setHtml(d['html_content'], QUrl(f"local://{t}/"))
-        else:
-            u = QUrl(t) if "." in t else QUrl(get_search_url(self.data['settings']['engine'], t))
-            if "://" not in t and "." in t: u = QUrl("https://"+t)
-            b.setUrl(u)
+        if t.endswith(self.data['settings']['suffix']) and t.lower() not in self.data['sites']: return
+        b.setUrl(self.resolve(t))
+
+    def suggest(self, t):
+        # Runs before QLineEdit asks the completer to pop up, so the popup shows these rows
+        m = self.comp.model(); m.clear()
+        for u, kind, title in self.omni.suggest(t):
+            it = QStandardItem(f"{Omnibox.ICONS[kind]}  {title} — {u}" if title else f"{Omnibox.ICONS[kind]}  {u}")
+            it.setData(u, Qt.ItemDataRole.UserRole); m.appendRow(it)
+    def omni_go(self, u): self.url.setText(u); self.nav()
+    def build_omni(self):
+        now = time.time()
+        extra = [(u, t, "navi", frecency(1, now)) for u, t in Omnibox.PAGES.items()]
+        extra += [(f"local://{k}/", v.get('title') or k, "site", frecency(1, now)) for k, v in self.data['sites'].items()]
+        extra += [(f"navi://dlw/view/{d['id']}", d['title'], "saved", frecency(1, d['time'])) for d in self.data['downloads']]
+        self.omni.rebuild(lambda: [(u, t, "history", frecency(v, l)) for u, t, v, l in self.store.url_rows()] + extra)
 
     def upd_url_for(self, q, b):
         if b == self.tabs.currentWidget():
             u = q.toString()
             if u.startswith("local://navi/") or u.startswith("app://"): self.url.setText("New Tab")
             elif not u.startswith("local://"): self.url.setText(u)
-        if q.scheme() in ["navi", "app"]: self.handle_cmd(q.toString(), b)
 
     def upd_url(self, i): 
         if i>=0: self.upd_url_for(self.tabs.widget(i).url(), self.tabs.widget(i))
     def upd_ti(self, t, b): 
         i = self.tabs.indexOf(b); 
-        if i!=-1: self.tabs.setTabText(i, t[:15])
+        if i!=-1 and t: self.tabs.setTabText(i, t[:15]) # discarded tabs report an empty title; keep the old one
 
     def back(self): self.tabs.currentWidget().back() if self.tabs.currentWidget() else None
     def fwd(self): self.tabs.currentWidget().forward() if self.tabs.currentWidget() else None
@@ -383,106 +1828,171 @@ class NaviBrowser(QMainWindow):
     def home(self): self.tabs.currentWidget().setUrl(QUrl("local://navi/"))
 
     def sch_rwd(self, n):
-        if time.time()-self.data['last_reward']>60: self.add_navits(n); self.data['last_reward']=time.time()
-    def add_navits(self, n, m=""): self.data['navits']+=n; self.save_data(); print(f"+{n} {m}")
+        if time.time()-self.data['last_reward']>60: self.data['last_reward']=time.time(); self.save_data('last_reward'); self.add_navits(n)
+    def add_navits(self, n, m=""): self.data['navits']+=n; self.save_data('navits'); print(f"+{n} {m}")
     def add_hist(self, u, t):
-        if not self.data['history'] or self.data['history'][0]['url']!=u:
-            self.data['history'].insert(0, {'url':u, 'title':t, 'time':time.time()}); self.save_data()
+        if u!=self.last_hist: self.last_hist = u; self.store.add_hist({'url':u, 'title':t, 'time':time.time()}); self.omni.visit(u, t); self.refresh_top()
+    def refresh_top(self):
+        if self.omni.pending is not None: return # still building; the stored list stays until the index is back
+        t = self.omni.top_sites(TOP_SITES)
+        if t != self.data['top_sites']: self.data['top_sites'] = t; self.save_data('top_sites')
+    def thumb_later(self, b):
+        u = b.url().toString()
+        if any(u == x[0] for x in self.data['top_sites']) and self.assets.thumb_stale(u): QTimer.singleShot(THUMB_DELAY_MS, lambda: self.thumb(b, u))
+    def thumb(self, b, u):
+        try:
+            if b.url().toString() == u and b.isVisible(): self.assets.save_thumb(u, b.grab().toImage())
+        except RuntimeError: pass # tab closed meanwhile
     def check_dead(self):
         if self.data['settings']['wholesome'] and time.time()-self.data['last_active']>TWO_WEEKS_SECONDS:
-            self.data['history'] = get_wholesome_history()
-        self.data['last_active'] = time.time(); self.save_data()
+            self.store.set_hist(get_wholesome_history())
+        self.data['last_active'] = time.time(); self.save_data('last_active')
+
+    def show_page(self, b, u):
+        # Re-request an internal page after an action invalidated it, without adding a history entry
+        if b.url().matches(QUrl(u), QUrl.UrlFormattingOption.StripTrailingSlash): b.reload()
+        else: b.setUrl(QUrl(u))
 
+    @timed("handle_cmd")
     def handle_cmd(self, u, b):
-        cmd = u.lower().replace("navi://", "").replace("app://", "").strip("/")
+        # Actions only: pages are served by InternalRouter through the navi:// and local:// scheme handlers
+        cmd = navi_cmd(u)
         st = self.data['settings']
-        
-        if cmd=="" or cmd=="home" or cmd=="newtab" or cmd.startswith("newtab"): 
-            b.setHtml(InternalPages.new_tab(self.data), QUrl("local://navi/"))
-        elif cmd.startswith("navigate"):
+
+        if cmd.startswith("navigate"):
             q = QUrl(u).queryItems(); tgt=""
             for k,v in q: 
                 if k=="url": tgt=v
             if tgt: b.setUrl(QUrl(tgt))
-        
-        # --- Pages ---
-        elif cmd=="settings":
-            engines = "".join([f"<option {'selected' if e==st['engine'] else ''}>{e}</option>" for e in ["Google","Bing","Yahoo","DuckDuckGo","Ecosia","Yandex"]])
-            themes = "".join([f"<a href='navi://set/theme/{t}' class='btn' style='margin:5px'>{t.title()}</a>" for t in ["light","dark","cyberpunk","sunset","matrix"] if t in ["light","dark"] or t in self.data['inventory']])
-            m_l = "checked" if st.get('mode')=="legacy" else ""; m_m = "checked" if st.get('mode')=="modern" else ""
-            
-            h = f"""<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class="container"><div class="card"><h1>Settings</h1>
-            <h3>🎨 Visuals</h3>
-            <p><b>Engine Mode:</b> <label><input type="radio" name="m" {m_m} onclick="window.location='navi://set/mode/modern'"> Modern</label> <label><input type="radio" name="m" {m_l} onclick="window.location='navi://set/mode/legacy'"> Legacy</label></p>
-            <p>{themes}</p>
-            <h3>🔍 Search</h3><select onchange="window.location='navi://set/engine/'+this.value">{engines}</select>
-            <h3>🔗 Suffix</h3><input value="{st['suffix']}" onchange="window.location='navi://set/suffix/'+this.value">
-            </div></div></body></html>"""
-            b.setHtml(h, QUrl("local://navi/settings"))
-
-        elif cmd=="store":
-            inv = self.data['inventory']
-            def itm(i,n,c): return f"<div class='card'><h3>{n}</h3><a href='navi://buy/{i}' class='btn btn-gold'>Buy ({c})</a></div>" if i not in inv else ""
-            items = itm("cyberpunk","Cyberpunk",100) + itm("sunset","Sunset",100) + itm("matrix","Matrix",125) + itm("christmas","Christmas",150) + itm("halloween","Halloween",150)
-            b.setHtml(f"<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class='container'><h1>🛒 Store ({self.data['navits']} N)</h1><div class='widget-grid'>{items}</div></div></body></html>", QUrl("local://navi/store"))
-
-        # Actions
-        elif cmd.startswith("set/theme/"): st['theme'] = u.split("theme/")[1]; self.apply_theme(); self.save_data(); self.handle_cmd("navi://settings", b)
-        elif cmd.startswith("set/engine/"): st['engine'] = u.split("engine/")[1]; self.save_data()
-        elif cmd.startswith("set/mode/"): st['mode'] = u.split("mode/")[1]; self.apply_theme(); self.save_data(); self.handle_cmd("navi://settings", b)
-        elif cmd.startswith("set/suffix/"): st['suffix'] = u.split("suffix/")[1]; self.save_data()
-        elif cmd.startswith("set/bg/"): st['bg_url'] = QUrl.fromPercentEncoding(u.split("bg/")[1].encode()); self.save_data(); self.handle_cmd("navi://home", b)
+
+        elif cmd.startswith("set/theme/"): st['theme'] = u.split("theme/")[1]; self.apply_theme(); self.save_data('settings')
+        elif cmd.startswith("set/engine/"): st['engine'] = u.split("engine/")[1]; self.save_data('settings')
+        elif cmd.startswith("set/mode/"): st['mode'] = u.split("mode/")[1]; self.apply_theme(); self.save_data('settings')
+        elif cmd.startswith("set/suffix/"): st['suffix'] = u.split("suffix/")[1]; self.save_data('settings')
+        elif cmd.startswith("set/histdays/"):
+            st['hist_days'] = int(cmd.split("histdays/")[1] or 0); self.save_data('settings')
+            self.expire_hist()
+        elif cmd.startswith("set/tabbudget/"): st['tab_budget'] = max(1, int(cmd.split("tabbudget/")[1] or 1)); self.save_data('settings')
+        elif cmd.startswith("set/membudget/"): st['mem_budget'] = max(0, int(cmd.split("membudget/")[1] or 0)); self.save_data('settings')
+        elif cmd.startswith("set/tabpool/"): st['tab_pool'] = min(4, max(0, int(cmd.split("tabpool/")[1] or 0))); self.save_data('settings'); self.pool.schedule()
+        elif cmd.startswith("set/adblock/"): st['adblock'] = cmd.endswith("/on"); self.save_data('settings')
+        elif cmd.startswith("set/blockallow/"):
+            st['block_allow'] = QUrl.fromPercentEncoding(u.split("blockallow/")[1].encode()).lower().replace(",", " ").split()
+            self.blocker.allow = set(st['block_allow']); self.save_data('settings')
+        elif cmd.startswith("set/cachetype/"): st['cache_type'] = cmd.split("cachetype/")[1]; self.save_data('settings'); self.profiles.reconfigure()
+        elif cmd.startswith("set/cachemb/"): st['cache_mb'] = max(0, int(cmd.split("cachemb/")[1] or 0)); self.save_data('settings'); self.profiles.reconfigure()
+        elif cmd.startswith("set/cachepath/"): st['cache_path'] = QUrl.fromPercentEncoding(u.split("cachepath/")[1].encode()).strip(); self.save_data('settings'); self.profiles.reconfigure()
+        elif cmd.startswith("set/storagepath/"): st['storage_path'] = QUrl.fromPercentEncoding(u.split("storagepath/")[1].encode()).strip(); self.save_data('settings')
+        elif cmd.startswith("profile/use/"):
+            n = Profiles.clean(QUrl.fromPercentEncoding(u.split("use/")[1].encode()))
+            st['profile'] = n
+            if n not in st['profiles']: st['profiles'].append(n)
+            self.save_data('settings'); self.add_tab()
+        elif cmd.startswith("cache/clear/"):
+            n = Profiles.clean(cmd.split("clear/")[1])
+            if n in self.profiles.all: self.profiles.all[n].clearHttpCache()
+            self.show_page(b, "navi://cache")
+        elif cmd.startswith("set/mhtml/"): st['dl_mhtml'] = cmd.endswith("/on"); self.save_data('settings')
+        elif cmd.startswith("set/bg/"): st['bg_url'] = QUrl.fromPercentEncoding(u.split("bg/")[1].encode()); self.save_data('settings'); self.show_page(b, "local://navi/")
         elif cmd.startswith("buy/"):
             i = u.split("buy/")[1]; c = {"cyberpunk":100,"sunset":100,"matrix":125,"christmas":150,"halloween":150}.get(i,999)
-            if self.data['navits']>=c: self.data['navits']-=c; self.data['inventory'].append(i); self.save_data(); self.handle_cmd("navi://store",b)
+            if self.data['navits']>=c: self.data['navits']-=c; self.data['inventory'].append(i); self.save_data('navits', 'inventory'); self.show_page(b, "navi://store")
             else: QMessageBox.warning(self,"Poor","Need more Navits!")
 
-        # Lists & Tools
-        elif cmd=="pw": b.setHtml(f"<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class='container'><h1>Sites</h1><a href='navi://pw/new' class='btn'>+ New</a><br><br><div class='widget-grid'>{''.join([f'<div class=card><b>{v["title"]}</b><br>{k}<br><a href="{k}" class=btn>Go</a> <a href="navi://pw/edit/{k}" class=btn>Edit</a> <a href="navi://pw/del/{k}" class="btn btn-danger">Del</a></div>' for k,v in self.data['sites'].items()])}</div></div></body></html>", QUrl("local://pw"))
-        elif cmd=="cws": b.setHtml(f"<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class='container'><h1>Extensions</h1><a href='navi://cws/new' class='btn'>+ New</a><br><br><div class='widget-grid'>{''.join([f'<div class=card><h3>{k}</h3><a href=navi://cws/toggle/{k} class=btn>Toggle ({self.data["extensions"][k]["active"]})</a></div>' for k in self.data['extensions']])}</div></div></body></html>", QUrl("local://cws"))
-        elif cmd=="history": b.setHtml(f"<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class='container'><h1>History</h1>{''.join([f'<div class=card><a href={h["url"]}>{h["title"]}</a></div>' for h in self.data["history"]])}</div></body></html>", QUrl("local://hist"))
-        elif cmd=="dlw": b.setHtml(f"<html><head><style>{InternalPages.css(st['theme'])}</style></head><body><div class='container'><h1>Downloads</h1>{''.join([f'<div class=card><h3>{d["title"]}</h3><a href=navi://dlw/view/{d["id"]} class=btn>View</a></div>' for d in self.data["downloads"]])}</div></body></html>", QUrl("local://dlw"))
-        
         # Editors
         elif cmd=="pw/new": CodeEditor(self, "site").show()
         elif cmd.startswith("pw/edit/"): CodeEditor(self, "site", QUrl.fromPercentEncoding(u.split("edit/")[1].encode())).show()
-        elif cmd.startswith("pw/del/"): d = QUrl.fromPercentEncoding(u.split("del/")[1].encode()); del self.data['sites'][d]; self.save_data(); self.handle_cmd("navi://pw", b)
+        elif cmd.startswith("pw/del/"): d = QUrl.fromPercentEncoding(u.split("del/")[1].encode()); del self.data['sites'][d]; self.sites.remove(d); self.save_data('sites'); self.build_omni(); self.show_page(b, "navi://pw")
         elif cmd=="cws/new": CodeEditor(self, "ext").show()
-        elif cmd.startswith("cws/toggle/"): n=u.split("toggle/")[1]; self.data['extensions'][n]['active'] = not self.data['extensions'][n]['active']; self.save_data(); self.handle_cmd("navi://cws",b)
+        elif cmd.startswith("cws/edit/"): CodeEditor(self, "ext", QUrl.fromPercentEncoding(u.split("edit/")[1].encode())).show()
+        elif cmd.startswith("cws/toggle/"): n=QUrl.fromPercentEncoding(u.split("toggle/")[1].encode()); self.data['extensions'][n]['active'] = not self.data['extensions'][n]['active']; self.ext.install(n, self.data['extensions'][n]); self.save_data('extensions'); self.show_page(b, "navi://cws")
         elif cmd.startswith("dlw/view/"): 
             did=u.split("view/")[1]; p=next((x for x in self.data['downloads'] if x['id']==did),None)
-            if p: b.setHtml(p['html'], QUrl("local://offline"))
+            if p: self.view_dl(p, b)
+        elif cmd == "perf/export": n = PERF.export(PERF_FILE); QMessageBox.information(self, "Performance", f"Wrote {n} records to {os.path.abspath(PERF_FILE)}")
 
-    def dl_pg(self): self.tabs.currentWidget().page().toHtml(lambda h: self.save_dl(self.tabs.currentWidget().title(), h))
-    def save_dl(self, t, h): self.data['downloads'].append({'title':t,'html':h,'id':str(int(time.time()))}); self.save_data()
+    def view_dl(self, p, b):
+        if p['kind'] != "mhtml": b.setUrl(QUrl(f"navi://archive/{p['id']}")); return
+        # MHTML only renders from a file, so it is unpacked to a temp file that goes once the page has loaded
+        try: data = self.archive.get(p['blob'])
+        except (OSError, zlib.error): QMessageBox.warning(self, "Missing", "This saved page is no longer in the archive."); return
+        fd, f = tempfile.mkstemp(prefix="navi-", suffix=".mhtml")
+        with os.fdopen(fd, 'wb') as fh: fh.write(data)
+        def gone(ok):
+            b.loadFinished.disconnect(gone)
+            if os.path.exists(f): os.remove(f)
+        b.loadFinished.connect(gone)
+        b.setUrl(QUrl.fromLocalFile(f))
+
+    def dl_pg(self):
+        b = self.tabs.currentWidget()
+        if not b: return
+        t, u = b.title(), b.url().toString()
+        if self.data['settings'].get('dl_mhtml'): self.save_mhtml(b, t, u)
+        else: b.page().toHtml(lambda h: self.save_dl(t, h.encode(), u))
+    def save_mhtml(self, b, t, u):
+        # QWebEnginePage.save is async; pick up its download request to know when the .mhtml is complete
+        f = os.path.abspath(os.path.join(self.archive.root, f"tmp-{time.time_ns()}.mhtml")); prof = b.page().profile()
+        def req(r):
+            if not r.isSavePageDownload(): return
+            drop(); r.isFinishedChanged.connect(lambda: done(r))
+        def drop():
+            try: prof.downloadRequested.disconnect(req)
+            except TypeError: pass # already picked up its download
+        def done(r):
+            if r.state() == QWebEngineDownloadRequest.DownloadState.DownloadCompleted:
+                with open(f, 'rb') as fh: self.save_dl(t, fh.read(), u, "mhtml")
+            if os.path.exists(f): os.remove(f)
+        prof.downloadRequested.connect(req)
+        QTimer.singleShot(SAVE_START_MS, drop) # save() fails silently, e.g. on a page that hasn't loaded
+        b.page().save(f, QWebEngineDownloadRequest.SavePageFormat.MimeHtmlSaveFormat)
+    def save_dl(self, t, data, u="", kind="html"):
+        d = {'id':str(time.time_ns()), 'title':t, 'url':u, 'blob':self.archive.put(data), 'kind':kind, 'size':len(data), 'time':time.time()}
+        self.data['downloads'].append(d); self.store.add_dl(d); self.router.touch('downloads')
+        self.omni.add(f"navi://dlw/view/{d['id']}", t, "saved", frecency(1, d['time']))
     def src(self): self.tabs.currentWidget().page().toHtml(lambda h: SourceViewer(h, self).exec())
-    def save_data(self):
-        try: 
-            with open(DATA_FILE, 'w') as f: json.dump(self.data, f)
-        except: pass
-    def load_data(self):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, 'r') as f: 
-                    d = json.load(f)
-                    # Safe Merge
-                    if 'settings' in d: self.data['settings'].update(d['settings'])
-                    for k in d: 
-                        if k!='settings' and k in self.data: self.data[k]=d[k]
-                    # Ensure defaults
-                    defaults = {'theme': 'dark', 'engine': 'Google', 'suffix': '.pw-navi', 'wholesome': True, 'mode': 'modern', 'bg_url': ''}
-                    for k,v in defaults.items(): 
-                        if k not in self.data['settings']: self.data['settings'][k]=v
-            except: pass
+    @timed("save_data")
+    def save_data(self, *keys):
+        # Only the small profile keys are rewritten here; history and downloads are written per record by the store
+        for k in keys or KV_KEYS: self.store.put(k, self.data[k])
+        self.router.touch(*(keys or KV_KEYS))
+    def load_data(self, keys=None):
+        try:
+            if os.path.exists(DATA_FILE): self.store.migrate(DATA_FILE, self.archive)
+            d = self.store.load(keys)
+        except: d = None
+        if d:
+            # Safe Merge
+            if 'settings' in d: self.data['settings'].update(d['settings'])
+            for k in d:
+                if k!='settings' and k in self.data: self.data[k]=d[k]
+            # Ensure defaults
+            defaults = {'theme': 'dark', 'engine': 'Google', 'suffix': '.pw-navi', 'wholesome': True, 'mode': 'modern', 'bg_url': '', 'dl_mhtml': False, 'hist_days': 0, 'tab_budget': 15, 'mem_budget': 0, 'freeze_after': 120, 'tab_pool': 1, 'adblock': True, 'block_allow': [], 'profile': 'default', 'profiles': ['default'], 'cache_type': 'disk', 'cache_mb': 0, 'cache_path': '', 'storage_path': ''}
+            for k,v in defaults.items():
+                if k not in self.data['settings']: self.data['settings'][k]=v
+    def assets_ready(self): self.router.touch('assets')
+    def closeEvent(self, e): self.save_session(); self.pool.close(); self.assets.close(); self.archive.close(); self.store.close(); super().closeEvent(e)
     def apply_theme(self):
-        self.setStyleSheet(BrowserStyles.get(self.data['settings']['theme'], self.data['settings'].get('mode', 'modern')))
-        if self.tabs.currentWidget(): self.tabs.currentWidget().reload()
+        st = self.data['settings']; key = (st['theme'], st.get('mode', 'modern'))
+        if key == self.theme: return
+        self.theme = key; bg, bar, tabs = BrowserStyles.get(*key)
+        # Only the chrome is restyled; the window background goes through the palette, which re-polishes nothing
+        pal = self.palette(); pal.setColor(QPalette.ColorRole.Window, QColor(bg)); self.setPalette(pal)
+        self.tb.setStyleSheet(bar); self.tabs.tabBar().setStyleSheet(tabs)
+        self.comp.popup().setStyleSheet(bar) # the suggestion popup is a separate window
+        # Open internal pages just swap their CSS variables; web pages don't depend on the theme
+        for i in range(self.tabs.count()):
+            b = self.tabs.widget(i)
+            if isinstance(b, BrowserTab) and b.url().scheme() == "navi": b.page().runJavaScript(InternalPages.theme_js(*key))
 
 if __name__ == '__main__':
+    TRACE.mark("imports")
+    for a in sys.argv[1:]:
+        if a.split("=")[0] == "--profile-startup": TRACE.path = a.partition("=")[2] or TRACE_FILE; sys.argv.remove(a)
+    register_schemes()
     app = QApplication(sys.argv)
-    QApplication.setApplicationName("Navi Browser")
-    window = NaviBrowser()
-    window.show()
+    QApplication.setApplicationName("Navi Browser"); TRACE.mark("qapp")
+    window = NaviBrowser(launch_urls(sys.argv[1:])) # after QApplication has taken its own arguments out of sys.argv
+    if "--new-instance" not in sys.argv: window.listen()
+    window.show(); TRACE.mark("shown")
     sys.exit(app.exec())
-
-